@@ -1,47 +1,114 @@
 from flask import Flask, render_template, redirect, url_for, flash, request, \
-    session
+    session, jsonify, stream_template, g, Response, get_flashed_messages
 from functools import wraps
 import google_classroom_service as gcs
-import json
-import os
-import pickle  # For storing credentials in session after OAuth
+import config_store
+import coursework_plan
+import jobs
+import journal
+import metrics
+import mirror
+import school_calendar
+from itsdangerous import BadSignature, URLSafeSerializer
+import time
+from datetime import date
+from urllib.parse import urlsplit
 
 app = Flask(__name__)
 # Important: Set a strong secret key for session management in a real app
 app.secret_key = 'your secret key'
 
-CONFIG_FILE_PATH = 'schedule_config.json'
-DAYS_OF_WEEK = [
-    "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday",
-    "Sunday"
-]
+DAYS_OF_WEEK = list(school_calendar.DAYS_OF_WEEK)
+# Fields of an assignment captured in the bulk edit form, so a save can be
+# diffed against what the user saw without re-listing the course.
+SNAPSHOT_FIELDS = ('id', 'title', 'dueDate', 'maxPoints', 'updateTime')
+# Coursework states the search page filters on.
+SEARCH_STATES = ('PUBLISHED', 'DRAFT')
+SEARCH_MAX_RESULTS = 500
 
 
 def load_schedule_config():
-    """Loads schedule configuration from JSON file."""
-    if os.path.exists(CONFIG_FILE_PATH):
-        try:
-            with open(CONFIG_FILE_PATH, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            flash(
-                "Error: schedule_config.json is corrupted. Please re-save.",
-                "error"
-            )
-            return {}  # Return empty dict if corrupted
-    return {}
+    """Loads schedule configuration from the shared config store."""
+    try:
+        return config_store.get_store().load()
+    except ValueError:
+        flash(
+            "Error: schedule_config.json is corrupted. Please re-save.",
+            "error"
+        )
+        return {}  # Return empty dict if corrupted
+
+
+def parse_date_list(text):
+    """Parses comma separated YYYY-MM-DD dates; raises ValueError."""
+    dates = [value.strip() for value in (text or '').split(',')
+             if value.strip()]
+    for value in dates:
+        date.fromisoformat(value)
+    return sorted(set(dates))
 
 
 def save_schedule_config(config_data):
-    """Saves schedule configuration to JSON file."""
+    """Saves schedule configuration through the shared config store."""
     try:
-        with open(CONFIG_FILE_PATH, 'w') as f:
-            json.dump(config_data, f, indent=4)
+        config_store.get_store().save(config_data)
         flash("Schedule configuration saved successfully!", "success")
     except Exception as e:
         flash(f"Error saving schedule configuration: {str(e)}", "error")
 
 
+def _snapshot_serializer():
+    return URLSafeSerializer(app.secret_key, salt='assignment-snapshot')
+
+
+def make_assignment_snapshot(assignment):
+    """Returns a signed token holding the editable fields and version."""
+    return _snapshot_serializer().dumps(
+        {k: assignment[k] for k in SNAPSHOT_FIELDS if k in assignment}
+    )
+
+
+def load_assignment_snapshot(token):
+    """Decodes a snapshot token; returns None if missing or tampered with."""
+    if not token:
+        return None
+    try:
+        return _snapshot_serializer().loads(token)
+    except BadSignature:
+        return None
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    """Times each route, including the body of streamed responses."""
+    started_at = g.get('request_started_at')
+    if started_at is None:
+        return response
+    labels = {
+        'endpoint': request.endpoint or 'unmatched',
+        'method': request.method,
+        'status': str(response.status_code)
+    }
+    # Streamed templates are still rendering here; observe on close instead.
+    response.call_on_close(
+        lambda: metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started_at, **labels)
+    )
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint for API call and route latencies."""
+    return Response(metrics.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/login')
 def login():
     flow = gcs.get_flow()
@@ -75,23 +142,23 @@ def oauth2callback():
         print(f"OAuth token fetch error: {e}")
         return redirect(url_for('index'))
 
-    credentials = flow.credentials
-    session['credentials'] = pickle.dumps(credentials)
-    with open(gcs.TOKEN_PICKLE_PATH, 'wb') as token_file:
-        pickle.dump(credentials, token_file)
-    
+    gcs.store_credentials(flow.credentials)
+
     flash('Authentication successful!', 'success')
     return redirect(url_for('index'))
 
 
 @app.route('/logout')
 def logout():
-    session.pop('credentials', None)
-    if os.path.exists(gcs.TOKEN_PICKLE_PATH):
-        try:
-            os.remove(gcs.TOKEN_PICKLE_PATH)
-        except Exception as e:
-            print(f"Error removing token.pickle: {e}")
+    creds = gcs.get_credentials_from_session_or_pickle()
+    if creds:
+        gcs.invalidate_course_directory()
+        gcs.clear_service_cache(creds)
+        mirror.stop_syncing(creds)
+    try:
+        gcs.forget_credentials()
+    except Exception as e:
+        print(f"Error removing token.pickle: {e}")
     flash('You have been logged out.', 'info')
     return redirect(url_for('index'))
 
@@ -99,18 +166,39 @@ def logout():
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not gcs.get_credentials_from_session_or_pickle():
+        creds = gcs.get_credentials_from_session_or_pickle()
+        if not creds:
             flash("Please log in to access this page.", "warning")
             return redirect(url_for('login', next=request.url))
+        mirror.ensure_syncing(creds)
         return f(*args, **kwargs)
     return decorated_function
 
 
+# Pages read from the local mirror (see mirror.py) and only fall back to
+# Classroom for data that has not been synced yet.
+def get_courses():
+    """Returns the user's courses, or None if they could not be listed."""
+    courses = mirror.get_courses()
+    return courses if courses is not None else gcs.list_courses()
+
+
+def get_course_name(course_id):
+    """Returns a course's name, or None."""
+    return mirror.get_course_name(course_id) or gcs.get_course_name(course_id)
+
+
+def get_assignment(course_id, assignment_id):
+    """Returns a coursework item, or None."""
+    return (mirror.get_course_work_item(course_id, assignment_id) or
+            gcs.get_course_work_item(course_id, assignment_id))
+
+
 @app.route('/')
 @login_required
 def index():
     try:
-        courses = gcs.list_courses()
+        courses = get_courses()
         if courses is None:
             flash(
                 "Error: Could not retrieve courses. "
@@ -136,33 +224,82 @@ def index():
         return render_template('index.html', courses=[])
 
 
+@app.route('/courses/refresh')
+@login_required
+def refresh_courses():
+    gcs.invalidate_course_directory()
+    courses = gcs.list_courses()
+    if courses is not None:
+        mirror.store_courses(courses)
+    flash("Course list refreshed from Google Classroom.", "info")
+    return redirect(url_for('index'))
+
+
 @app.route('/course/<course_id>')
 @login_required
 def view_course(course_id):
+    # The page may be streamed, and a streamed body renders after the
+    # session cookie was saved, so flashes are consumed up front.
+    messages = get_flashed_messages(with_categories=True)
     try:
-        assignments = gcs.list_course_work(course_id)
-        course_name = "Selected Course"  # Default course name
-
-        if assignments is None:
-            flash_msg = (
-                f"Error: Could not retrieve assignments for course "
-                f"{course_id}. Check console."
+        course_name = get_course_name(course_id) or "Selected Course"
+        refresh = bool(request.args.get('refresh'))
+        topics = None if refresh else mirror.get_topics(course_id)
+        topics_listed = topics is None
+        if topics is None:
+            try:
+                topics = gcs.get_topic_index(course_id,
+                                             refresh=refresh)['by_id']
+            except Exception as e:
+                print(f"Error listing topics for course {course_id}: {e}")
+                topics = {}
+                topics_listed = False
+
+        assignments = None
+        if not refresh:
+            assignments = mirror.get_course_work(course_id)
+            if assignments is None:
+                assignments = gcs.get_cached_course_work(course_id,
+                                                         'mirror')
+        if assignments is not None:
+            return render_template(
+                'view_course.html',
+                assignments=assignments,
+                listing={'error': None},
+                messages=messages,
+                topics=topics,
+                course_id=course_id,
+                course_name=course_name
             )
-            flash(flash_msg, "error")
-            assignments = []
-        elif not assignments:
-            flash("No assignments found for this course.", "info")
 
-        all_courses = gcs.list_courses()
-        if all_courses:
-            for c in all_courses:
-                if c['id'] == course_id:
-                    course_name = c.get('name', course_id)
-                    break
+        # Not mirrored, or an explicit refresh: stream the page while
+        # Classroom pages through the coursework, so the first assignments
+        # show up immediately, then store the listing in the mirror.
+        listing = {'error': None}
+
+        def stream_assignments():
+            items = []
+            try:
+                for item in gcs.iter_course_work(course_id,
+                                                 profile='mirror'):
+                    items.append(item)
+                    yield item
+            except Exception as e:
+                print(f"Error listing coursework for course {course_id}: {e}")
+                listing['error'] = (
+                    f"Error: Could not retrieve all assignments for course "
+                    f"{course_id}. Check console."
+                )
+                return
+            if topics_listed:
+                mirror.store_course_listing(course_id, items, topics)
 
-        return render_template(
+        return stream_template(
             'view_course.html',
-            assignments=assignments,
+            assignments=stream_assignments(),
+            listing=listing,
+            messages=messages,
+            topics=topics,
             course_id=course_id,
             course_name=course_name
         )
@@ -171,6 +308,8 @@ def view_course(course_id):
             f"An unexpected error occurred while loading course details: "
             f"{str(e)}. Check console."
         )
+        for category, message in messages:
+            flash(message, category)
         flash(msg, "error")
         print(f"Error in view_course route for {course_id}: {e}")
         return redirect(url_for('index'))
@@ -183,9 +322,10 @@ def schedule_config_route():
         try:
             school_year_start = request.form.get('school_year_start')
             school_year_end = request.form.get('school_year_end')
+            holidays = parse_date_list(request.form.get('holidays'))
 
             course_schedules = []
-            courses_from_api = gcs.list_courses()
+            courses_from_api = get_courses()
 
             if courses_from_api:
                 for course in courses_from_api:
@@ -199,12 +339,18 @@ def schedule_config_route():
                                 "course_name": course.get(
                                     'name', 'Unknown Course'
                                 ),
-                                "days": selected_days
+                                "days": selected_days,
+                                "exclusions": parse_date_list(
+                                    request.form.get(
+                                        f'course_exclusions_{course_id}'
+                                    )
+                                )
                             })
 
             config_data = {
                 "school_year_start": school_year_start,
                 "school_year_end": school_year_end,
+                "holidays": holidays,
                 "course_schedules": course_schedules
             }
             save_schedule_config(config_data)
@@ -217,7 +363,7 @@ def schedule_config_route():
             print(f"Error in schedule_config_route (POST): {e}")
 
     current_config = load_schedule_config()
-    available_courses = gcs.list_courses()
+    available_courses = get_courses()
 
     if available_courses is None:
         flash(
@@ -227,11 +373,24 @@ def schedule_config_route():
         )
         available_courses = []
 
+    meeting_counts = {}
+    for schedule in current_config.get('course_schedules', []):
+        try:
+            calendar = config_store.get_store().calendar(
+                schedule.get('course_id')
+            )
+        except ValueError as e:
+            print(f"Invalid schedule for {schedule.get('course_id')}: {e}")
+            continue
+        if calendar is not None:
+            meeting_counts[schedule['course_id']] = len(calendar.meetings)
+
     return render_template(
         'schedule_config.html',
         config=current_config,
         courses=available_courses,
-        days_of_week=DAYS_OF_WEEK
+        days_of_week=DAYS_OF_WEEK,
+        meeting_counts=meeting_counts
     )
 
 
@@ -243,9 +402,7 @@ def schedule_config_route():
 def edit_assignment_route(course_id, assignment_id):
     if request.method == 'POST':
         try:
-            original_assignment = gcs.get_course_work_item(
-                course_id, assignment_id
-            )
+            original_assignment = get_assignment(course_id, assignment_id)
             if not original_assignment:
                 flash("Error: Original assignment not found. Cannot update.",
                       "error")
@@ -287,14 +444,8 @@ def edit_assignment_route(course_id, assignment_id):
 
     # GET request:
     try:
-        assignment = gcs.get_course_work_item(course_id, assignment_id)
-        course_name = "Selected Course"
-        all_courses = gcs.list_courses()
-        if all_courses:
-            for c in all_courses:
-                if c['id'] == course_id:
-                    course_name = c.get('name', course_id)
-                    break
+        assignment = get_assignment(course_id, assignment_id)
+        course_name = get_course_name(course_id) or "Selected Course"
 
         if not assignment:
             flash('Assignment not found or error fetching details.', 'error')
@@ -319,20 +470,11 @@ def edit_assignment_route(course_id, assignment_id):
 @login_required
 def bulk_edit_assignments_route(course_id):
     course_name = "Selected Course"
-    actual_course_name_obj = gcs.get_course_name(course_id)
+    actual_course_name_obj = get_course_name(course_id)
     if actual_course_name_obj:
         course_name = actual_course_name_obj
 
-    original_assignments_dict = {}
-    current_assignments = gcs.list_course_work(course_id)
-    if current_assignments:
-        for assign in current_assignments:
-            original_assignments_dict[assign['id']] = assign
-    else:  # Handle case where there are no assignments
-        current_assignments = []
-
     if request.method == 'POST':
-        updated_count = 0
         error_count = 0
         error_messages = []
 
@@ -346,134 +488,309 @@ def bulk_edit_assignments_route(course_id):
             return redirect(url_for('bulk_edit_assignments_route',
                                     course_id=course_id))
 
-        # Iterate only through selected and known assignments
+        # Diff the submitted form against the snapshots the page was
+        # rendered from; only fields that really change are patched.
+        snapshots = {}
+        desired = []
         for assign_id in selected_assignment_ids:
-            if assign_id not in original_assignments_dict:
+            original_assignment = load_assignment_snapshot(
+                request.form.get(f'snapshot_{assign_id}')
+            )
+            if (original_assignment is None or
+                    original_assignment.get('id') != assign_id):
                 error_msg = f"Skipped unknown assignment ID: {assign_id}"
                 error_messages.append(error_msg)
                 error_count += 1
                 continue  # Should not happen if form is from our GET
 
-            original_assignment = original_assignments_dict[assign_id]
-            update_mask_fields = []
-            assignment_body = {}
-
-            # Title: Get from form (potentially modified by JS/user)
-            submitted_title = request.form.get(f'title_{assign_id}')
-
-            if submitted_title is not None and \
-               submitted_title != original_assignment.get('title'):
-                assignment_body['title'] = submitted_title
-                update_mask_fields.append('title')
-            elif submitted_title is not None:  # Title submitted, even if same
-                assignment_body['title'] = submitted_title
-
-            # --- Due Date logic (only for selected assignments) ---
-            new_due_date_str = request.form.get(f'due_date_{assign_id}')
-            original_due_date_obj = original_assignment.get('dueDate')
-            original_due_date_str = ""
-            if original_due_date_obj and all(
-                original_due_date_obj.get(k) for k in ['year', 'month', 'day']
-            ):
-                original_due_date_str = (
-                    f"{original_due_date_obj['year']}-"
-                    f"{original_due_date_obj['month']:02d}-"
-                    f"{original_due_date_obj['day']:02d}")
-
-            if new_due_date_str is not None and \
-               new_due_date_str != original_due_date_str:
-                if new_due_date_str:
-                    year, month, day = map(int, new_due_date_str.split('-'))
-                    due_payload = {"year": year, "month": month, "day": day}
-                    assignment_body['dueDate'] = due_payload
-                    update_mask_fields.append('dueDate')
-                else:  # Empty string means clear due date
-                    assignment_body['dueDate'] = None
-                    update_mask_fields.append('dueDate')
-            elif (new_due_date_str is not None and
-                  'dueDate' not in update_mask_fields and
-                  original_due_date_obj):
-                # Submitted, no change, not in mask: add original to body
-                if 'dueDate' not in assignment_body:
-                    assignment_body['dueDate'] = original_due_date_obj
-
-            # --- Max Points logic (only for selected assignments) ---
-            new_max_points_str = request.form.get(f'max_points_{assign_id}')
-            original_max_points = original_assignment.get('maxPoints')
-            new_max_points = None
-            title_for_err = original_assignment.get('title', 'Unknown Assign.')
-
-            if new_max_points_str is not None:  # Field was present in form
-                if new_max_points_str.strip():
-                    try:
-                        new_max_points = int(new_max_points_str)
-                    except ValueError:
-                        error_count += 1
-                        error_messages.append(f"Invalid points for '{title_for_err}'.")
-                        continue
-                else:  # Empty string submitted, means clear points
-                    new_max_points = None
-
-            max_points_changed_or_cleared = False
-            if new_max_points_str is not None:
-                # If the field was submitted at all
-                if new_max_points != original_max_points:
-                    max_points_changed_or_cleared = True
-
-            if max_points_changed_or_cleared:
-                assignment_body['maxPoints'] = new_max_points
-                update_mask_fields.append('maxPoints')
-            elif (new_max_points_str is not None and
-                  new_max_points_str.strip() and
-                  'maxPoints' not in update_mask_fields):
-                # Submitted, valid, no change, not in mask: add to body
-                if 'maxPoints' not in assignment_body:
-                    assignment_body['maxPoints'] = new_max_points
-
-            if update_mask_fields:
-                # Ensure title is in body if update is happening
-                if 'title' not in assignment_body and submitted_title is not None:
-                    assignment_body['title'] = submitted_title
-                elif ('title' not in assignment_body and
-                      original_assignment.get('title')):
-                    # Fallback if title field somehow missing but was original
-                    assignment_body['title'] = original_assignment.get('title')
-
-                update_mask = ','.join(sorted(list(set(update_mask_fields))))
-                try:
-                    gcs.update_course_work(course_id, assign_id,
-                                           assignment_body, update_mask)
-                    updated_count += 1
-                except Exception as e:
-                    error_count += 1
-                    error_messages.append(f"Updating '{title_for_err}': {e}")
-
-        if updated_count > 0:
-            flash(f"{updated_count} selected assignment(s) updated.", "success")
+            snapshots[assign_id] = original_assignment
+            desired.append({
+                'id': assign_id,
+                'title': request.form.get(f'title_{assign_id}',
+                                          original_assignment.get('title')),
+                'dueDate': request.form.get(
+                    f'due_date_{assign_id}',
+                    coursework_plan.date_string(
+                        original_assignment.get('dueDate')
+                    )
+                ),
+                'maxPoints': request.form.get(
+                    f'max_points_{assign_id}',
+                    original_assignment.get('maxPoints')
+                ),
+            })
+
+        plan = coursework_plan.plan_changes(list(snapshots.values()), desired)
+        for assign_id, message in plan['errors']:
+            title_for_err = snapshots[assign_id].get('title',
+                                                     'Unknown Assign.')
+            error_messages.append(f"{message} ('{title_for_err}')")
+            error_count += 1
+
+        if request.form.get('action') == 'preview':
+            return render_template(
+                'bulk_edit_preview.html',
+                plan=plan,
+                describe_value=coursework_plan.describe_value,
+                error_messages=error_messages,
+                form_items=[(name, value)
+                            for name, value in request.form.items(multi=True)
+                            if name != 'action'],
+                course_id=course_id,
+                course_name=course_name
+            )
+
+        pending_updates = coursework_plan.plan_updates(plan)
+        titles_for_err = {change['id']: change['title']
+                          for change in plan['changes']}
+
         if error_count > 0:
             details = '; '.join(error_messages)
             flash_msg = f"{error_count} selected assignment(s) failed to update. " \
                         f"Details: {details}"
             flash(flash_msg, "error")
-        if not updated_count and not error_count and selected_assignment_ids:
+
+        if pending_updates:
+            creds = gcs.get_credentials_from_session_or_pickle()
+            versions = {assign_id: snapshots[assign_id].get('updateTime')
+                        for assign_id, _, _ in pending_updates}
+            # The versions belong to the fingerprint: the same edit made
+            # from a freshly loaded page is a new run, not a resume.
+            fingerprint = jobs.make_fingerprint(course_id, pending_updates,
+                                                versions)
+            job = jobs.submit_job(
+                'bulk_edit',
+                gcs.current_user_key(),
+                {assign_id: titles_for_err[assign_id]
+                 for assign_id, _, _ in pending_updates},
+                lambda job: run_bulk_edit_job(
+                    job, creds, course_id, pending_updates, versions,
+                    fingerprint
+                ),
+                fingerprint=fingerprint
+            )
+            flash(f"Updating {len(pending_updates)} selected assignment(s) "
+                  f"in the background.", "info")
+            return redirect(url_for(
+                'job_status_page', job_id=job.id,
+                next=url_for('bulk_edit_assignments_route',
+                             course_id=course_id)
+            ))
+
+        if not error_count and selected_assignment_ids:
             flash("No changes detected for selected assignments.", "info")
 
         return redirect(url_for('bulk_edit_assignments_route',
                                 course_id=course_id))
 
     # GET request
+    current_assignments = mirror.get_course_work(course_id)
+    if current_assignments is None:
+        current_assignments = gcs.list_course_work(
+            course_id, profile='summary'
+        ) or []
+    snapshots = {
+        assign['id']: make_assignment_snapshot(assign)
+        for assign in current_assignments
+    }
     return render_template(
         'bulk_edit_assignments.html',
         assignments=current_assignments,
+        snapshots=snapshots,
         course_id=course_id,
         course_name=course_name
     )
 
 
+def run_bulk_edit_job(job, creds, course_id, updates, versions,
+                      fingerprint):
+    """Applies bulk edit patches in the background, reporting per item.
+
+    Patches are checkpointed in the journal under fingerprint; resubmitting
+    the same edit after an interrupted or partly failed run only sends the
+    patches not yet applied. Items skipped because they changed in
+    Classroom stay skipped: the fingerprint covers the versions they were
+    checked against, so checking them again could only find them changed.
+    """
+    run = journal.get_journal().open_run(
+        'bulk_edit', course_id, fingerprint,
+        [assign_id for assign_id, _, _ in updates]
+    )
+    completed = run.completed()
+    for assign_id in completed:
+        job.set_item(assign_id, jobs.DONE, "Applied by an earlier run.")
+    skipped = run.skipped()
+    for assign_id, message in skipped.items():
+        job.set_item(assign_id, jobs.SKIPPED, message)
+    updates = [update for update in updates
+               if update[0] not in completed and update[0] not in skipped]
+    # Applied items now carry our own newer updateTime; checking them
+    # would report our own patch as a concurrent edit.
+    versions = {assign_id: version for assign_id, version in versions.items()
+                if assign_id not in completed and assign_id not in skipped}
+    with gcs.bound_credentials(creds):
+        # Only assignments that actually change need their version
+        # checked against Classroom before the patch is sent.
+        changed_since_render, fetch_errors = gcs.get_changed_course_work(
+            course_id, versions
+        )
+        for assign_id in changed_since_render:
+            message = ("Changed in Classroom after the page was loaded; "
+                       "reload and try again.")
+            job.set_item(assign_id, jobs.SKIPPED, message)
+            run.mark_skipped(assign_id, message)
+        for assign_id, error in fetch_errors.items():
+            if gcs.is_not_found(error):
+                message = "Deleted from Classroom after the page was loaded."
+                job.set_item(assign_id, jobs.FAILED, message)
+                run.mark_skipped(assign_id, message)
+            else:
+                message = f"Could not check for changes in Classroom: {error}"
+                job.set_item(assign_id, jobs.FAILED, message)
+                run.mark_failed(assign_id, message)
+        updates = [update for update in updates
+                   if update[0] not in changed_since_render and
+                   update[0] not in fetch_errors]
+        for assign_id, _, _ in updates:
+            job.set_item(assign_id, jobs.RUNNING)
+
+        def report(assign_id, updated_assignment, error):
+            if error is None:
+                job.set_item(assign_id, jobs.DONE)
+                run.mark_done(assign_id, assign_id)
+            else:
+                job.set_item(assign_id, jobs.FAILED, str(error))
+                run.mark_failed(assign_id, error)
+
+        gcs.batch_update_course_work(course_id, updates, on_result=report)
+    run.finish()
+
+
+def is_local_url(url):
+    """Tells whether url is a path on this site, safe to link back to.
+
+    Browsers read backslashes as slashes and drop tabs and newlines, so
+    '/\\host', or a tab between two slashes, would leave the site.
+    """
+    if not url.startswith('/') or '\\' in url or \
+            any(ord(char) < 32 for char in url):
+        return False
+    parts = urlsplit(url)
+    return not parts.scheme and not parts.netloc
+
+
+def parse_search_filters(args):
+    """Reads mirror.search filters from request args.
+
+    Returns (filters, errors); filters are None when nothing was asked.
+    """
+    filters, errors = {}, []
+    for name in ('text', 'course', 'prefix', 'without_prefix'):
+        value = (args.get(name) or '').strip()
+        if value:
+            filters[name] = value
+    states = [state for state in args.getlist('state')
+              if state in SEARCH_STATES]
+    if states:
+        filters['states'] = states
+    for name in ('due_from', 'due_to'):
+        value = (args.get(name) or '').strip()
+        if value:
+            try:
+                filters[name] = date.fromisoformat(value).isoformat()
+            except ValueError:
+                errors.append(f"Invalid date '{value}'; use YYYY-MM-DD.")
+    for name in ('min_points', 'max_points'):
+        value = (args.get(name) or '').strip()
+        if value:
+            try:
+                filters[name] = float(value)
+            except ValueError:
+                errors.append(f"Invalid points value '{value}'.")
+    if not filters:
+        return None, errors
+    try:
+        limit = int(args.get('limit') or SEARCH_MAX_RESULTS)
+    except ValueError:
+        limit = SEARCH_MAX_RESULTS
+    filters['limit'] = max(1, min(limit, SEARCH_MAX_RESULTS))
+    return filters, errors
+
+
+def run_search(filters):
+    """Runs a search; returns (results, truncated, seconds)."""
+    start = time.perf_counter()
+    # One extra row tells whether the limit cut the results short.
+    results = mirror.search(**dict(filters, limit=filters['limit'] + 1))
+    elapsed = time.perf_counter() - start
+    return (results[:filters['limit']], len(results) > filters['limit'],
+            elapsed)
+
+
+@app.route('/search')
+@login_required
+def search_coursework():
+    filters, errors = parse_search_filters(request.args)
+    for error in errors:
+        flash(error, "error")
+    searched = filters is not None and not errors
+    results, truncated, elapsed = [], False, None
+    if searched:
+        results, truncated, elapsed = run_search(filters)
+        if mirror.get_courses() is None:
+            flash("Your courses are still being synced; results may be "
+                  "incomplete.", "info")
+    return render_template('search.html', args=request.args,
+                           states=SEARCH_STATES, results=results,
+                           searched=searched, truncated=truncated,
+                           elapsed=elapsed)
+
+
+@app.route('/api/search')
+@login_required
+def search_api():
+    filters, errors = parse_search_filters(request.args)
+    if errors:
+        return jsonify({'error': ' '.join(errors)}), 400
+    if filters is None:
+        return jsonify({'error': 'No search filters given.'}), 400
+    results, truncated, elapsed = run_search(filters)
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'truncated': truncated,
+        'synced': mirror.get_courses() is not None,
+        'seconds': round(elapsed, 6),
+    })
+
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status_page(job_id):
+    job = jobs.get_job(job_id, gcs.current_user_key())
+    if job is None:
+        flash("Job not found. It may have expired.", "error")
+        return redirect(url_for('index'))
+    back_url = request.args.get('next', '')
+    if not is_local_url(back_url):
+        back_url = url_for('index')
+    return render_template('job_status.html', job=job.to_dict(),
+                           back_url=back_url)
+
+
+@app.route('/jobs/<job_id>/status')
+@login_required
+def job_status(job_id):
+    job = jobs.get_job(job_id, gcs.current_user_key())
+    if job is None:
+        return jsonify({'error': 'Job not found.'}), 404
+    return jsonify(job.to_dict())
+
+
 @app.route('/course/<course_id>/create-assignment', methods=['GET', 'POST'])
 @login_required
 def create_assignment_route(course_id):
-    course_name = gcs.get_course_name(course_id)  # Helper to get course name
+    course_name = get_course_name(course_id)  # Helper to get course name
     if not course_name:
         flash("Error: Course not found.", "error")
         return redirect(url_for('index'))
@@ -0,0 +1,313 @@
+"""A local stand-in for the Google Classroom REST API.
+
+Implements just enough of the courses, courseWork, topics and batch
+endpoints for google_classroom_service and the command-line scripts to run
+against it, with configurable latency, page size and injected 429s. Used by
+run_benchmarks.py; it can also be started on its own for manual testing:
+
+    python -m benchmarks.fake_classroom --port 8765 --courses 2 --assignments 100
+"""
+import argparse
+import email.parser
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class ClassroomState:
+    """In-memory courses, coursework and topics served by the fake API."""
+
+    def __init__(self, page_size=30, latency=0.0, error_rate=0.0,
+                 retry_after=0):
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.courses = {}
+        self.course_work = {}
+        self.topics = {}
+        self.http_requests = 0
+        self.api_calls = 0
+        self.injected_errors = 0
+        self._ids = itertools.count(100000)
+        self._lock = threading.Lock()
+
+    def new_id(self):
+        with self._lock:
+            return str(next(self._ids))
+
+    def add_course(self, name, assignments=0, topics=()):
+        """Adds a course with the given number of generated assignments."""
+        course_id = self.new_id()
+        self.courses[course_id] = {
+            'id': course_id,
+            'name': name,
+            'section': '',
+            'courseState': 'ACTIVE',
+            'updateTime': _now()
+        }
+        self.course_work[course_id] = {}
+        self.topics[course_id] = {}
+        for topic_name in topics:
+            self._create_topic(course_id, {'name': topic_name})
+        for number in range(assignments):
+            self._create_course_work(course_id, {
+                'title': f"Session {number + 1}",
+                'description': 'Generated assignment ' * 20,
+                'workType': 'ASSIGNMENT',
+                'state': 'PUBLISHED',
+                'maxPoints': 100,
+                'dueDate': {'year': 2025, 'month': 11, 'day': 5},
+                'dueTime': {'hours': 23, 'minutes': 59},
+                'materials': [{'link': {'url': 'https://example.com/x' * 5}}]
+            })
+        return course_id
+
+    def count(self, stat):
+        with self._lock:
+            setattr(self, stat, getattr(self, stat) + 1)
+
+    # --- Resource handlers; each returns (status, body dict). ---
+
+    def _paginate(self, items, query, key):
+        page_size = int(query.get('pageSize', [0])[0]) or self.page_size
+        start = int(query.get('pageToken', ['0'])[0] or 0)
+        page = items[start:start + page_size]
+        body = {key: page} if page else {}
+        if start + page_size < len(items):
+            body['nextPageToken'] = str(start + page_size)
+        return 200, body
+
+    def _create_course_work(self, course_id, body):
+        item = dict(body)
+        item.update({
+            'id': self.new_id(),
+            'courseId': course_id,
+            'creationTime': _now(),
+            'updateTime': _now()
+        })
+        item.setdefault('state', 'PUBLISHED')
+        self.course_work[course_id][item['id']] = item
+        return item
+
+    def _create_topic(self, course_id, body):
+        topic = {'courseId': course_id, 'topicId': self.new_id(),
+                 'name': body.get('name'), 'updateTime': _now()}
+        self.topics[course_id][topic['topicId']] = topic
+        return topic
+
+    def handle(self, method, path, query, body):
+        """Dispatches one (possibly batched) API call."""
+        self.count('api_calls')
+        if self.error_rate and random.random() < self.error_rate:
+            self.count('injected_errors')
+            return 429, {'error': {'code': 429,
+                                   'message': 'Quota exceeded (injected).',
+                                   'status': 'RESOURCE_EXHAUSTED'}}
+
+        parts = [part for part in path.split('/') if part][1:]  # drop 'v1'
+        if parts[:1] != ['courses']:
+            return 404, {'error': {'code': 404, 'message': 'Not found.'}}
+        if len(parts) == 1 and method == 'GET':
+            states = query.get('courseStates')
+            courses = [course for course in self.courses.values()
+                       if not states or course['courseState'] in states]
+            return self._paginate(courses, query, 'courses')
+
+        course_id = parts[1]
+        if course_id not in self.courses:
+            return 404, {'error': {'code': 404, 'message': 'No course.'}}
+        if len(parts) == 2 and method == 'GET':
+            return 200, self.courses[course_id]
+
+        collection = parts[2]
+        if collection == 'courseWork':
+            items = self.course_work[course_id]
+            if len(parts) == 3 and method == 'GET':
+                states = query.get('courseWorkStates')
+                listed = [item for item in items.values()
+                          if not states or item['state'] in states]
+                return self._paginate(listed, query, 'courseWork')
+            if len(parts) == 3 and method == 'POST':
+                return 200, self._create_course_work(course_id, body or {})
+            item = items.get(parts[3])
+            if item is None:
+                return 404, {'error': {'code': 404,
+                                       'message': 'No coursework.'}}
+            if method == 'GET':
+                return 200, item
+            if method == 'PATCH':
+                mask = query.get('updateMask', [''])[0].split(',')
+                for field in filter(None, mask):
+                    if (body or {}).get(field) is None:
+                        item.pop(field, None)
+                    else:
+                        item[field] = body[field]
+                item['updateTime'] = _now()
+                return 200, item
+        if collection == 'topics':
+            if method == 'GET':
+                return self._paginate(list(self.topics[course_id].values()),
+                                      query, 'topic')
+            if method == 'POST':
+                return 200, self._create_topic(course_id, body or {})
+        return 400, {'error': {'code': 400, 'message': 'Unsupported call.'}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send each response in one segment so delayed ACKs do not add ~40ms
+    # to every keep-alive request.
+    disable_nagle_algorithm = True
+    wbufsize = 1 << 16
+    state = None
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean.
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, payload, content_type='application/json',
+              extra_headers=None):
+        data = payload if isinstance(payload, bytes) else \
+            json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        if status == 429:
+            self.send_header('Retry-After', str(self.state.retry_after))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method):
+        self.state.count('http_requests')
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        raw_body = self._read_body()
+        parsed = urlparse(self.path)
+        if parsed.path == '/batch' and method == 'POST':
+            self._handle_batch(raw_body)
+            return
+        body = json.loads(raw_body) if raw_body else None
+        status, payload = self.state.handle(
+            method, parsed.path, parse_qs(parsed.query), body
+        )
+        self._send(status, payload)
+
+    def _handle_batch(self, raw_body):
+        message = email.parser.BytesParser().parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode() +
+            b'\r\n\r\n' + raw_body
+        )
+        boundary = 'fake_classroom_batch_boundary'
+        chunks = []
+        for part in message.get_payload():
+            request_text = part.get_payload()
+            head, _, body = request_text.replace('\r\n', '\n').partition('\n\n')
+            request_line = head.split('\n', 1)[0]
+            method, target, _ = request_line.split(' ', 2)
+            parsed = urlparse(target)
+            status, payload = self.state.handle(
+                method, parsed.path, parse_qs(parsed.query),
+                json.loads(body) if body.strip() else None
+            )
+            content_id = re.sub(r'^<', '<response-', part['Content-ID'])
+            extra = (f"Retry-After: {self.state.retry_after}\r\n"
+                     if status == 429 else '')
+            chunks.append(
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f"Content-Type: application/json\r\n{extra}\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        self._send(200, ''.join(chunks).encode('utf-8'),
+                   content_type=f'multipart/mixed; boundary={boundary}')
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+
+class FakeClassroomServer:
+    """Runs a ClassroomState behind a local HTTP server on a daemon thread."""
+
+    def __init__(self, state, host='127.0.0.1', port=0):
+        self._handler = type('Handler', (_Handler,), {'state': state})
+        self.httpd = ThreadingHTTPServer((host, port), self._handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def state(self):
+        return self._handler.state
+
+    def use_state(self, state):
+        """Serves a different ClassroomState from the same address."""
+        self._handler.state = state
+
+    @property
+    def root_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--courses', type=int, default=1)
+    parser.add_argument('--assignments', type=int, default=100)
+    parser.add_argument('--page-size', type=int, default=30)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    state = ClassroomState(page_size=args.page_size,
+                           latency=args.latency_ms / 1000.0,
+                           error_rate=args.error_rate)
+    for number in range(args.courses):
+        course_id = state.add_course(f"Course {number + 1}", args.assignments)
+        print(f"Course {course_id}: {args.assignments} assignments")
+    server = FakeClassroomServer(state, port=args.port).start()
+    print(f"Fake Classroom API at {server.root_url} "
+          f"(set CLASSROOM_ROOT_URL to use it). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""Microbenchmarks for google_classroom_service and the bulk tools.
+
+Runs each flow against the local fake Classroom server (fake_classroom.py)
+at several course sizes and writes one JSON record per (benchmark, size),
+so results can be diffed between commits in CI:
+
+    python -m benchmarks.run_benchmarks --sizes 10,100,1000 --output bench.json
+"""
+import argparse
+import base64
+import contextlib
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_classroom import ClassroomState, FakeClassroomServer
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+# Populated in main() once CLASSROOM_ROOT_URL points at the fake server;
+# google_classroom_service reads it when the module is first imported.
+gcs = None
+app_module = None
+create_quiz = None
+rename_assignments = None
+script = None
+
+
+def _fresh_course(server, size, latency, page_size, error_rate):
+    state = ClassroomState(page_size=page_size, latency=latency,
+                           error_rate=error_rate)
+    course_id = state.add_course('Benchmark Course', size)
+    server.use_state(state)
+    return state, course_id
+
+
+def bench_list_course_work(service, course_id, size):
+    items = gcs.list_course_work(course_id, refresh=True)
+    if items is None or len(items) != size:
+        raise RuntimeError("list_course_work returned the wrong item count.")
+
+
+def bench_update_course_work(service, course_id, size):
+    for item in gcs.list_course_work(course_id):
+        gcs.update_course_work(course_id, item['id'],
+                               {'title': item['title'] + ' (edited)'},
+                               'title')
+
+
+def bench_bulk_edit(service, course_id, size):
+    items = gcs.list_course_work(course_id, profile='summary')
+    updates = [(item['id'], {'title': '[BD] ' + item['title']}, 'title')
+               for item in items]
+    versions = {item['id']: item.get('updateTime') for item in items}
+    job = app_module.jobs.Job('bulk_edit', None,
+                              {item['id']: item['title'] for item in items},
+                              run=None)
+    creds = gcs.get_credentials_from_session_or_pickle()
+    app_module.run_bulk_edit_job(
+        job, creds, course_id, updates, versions,
+        app_module.jobs.make_fingerprint(course_id, updates, versions)
+    )
+    if job.counts().get(app_module.jobs.DONE, 0) != size:
+        raise RuntimeError(f"Bulk edit finished with {job.counts()}.")
+
+
+def bench_csv_create(service, course_id, size):
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='',
+                                     delete=False) as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['Group', 'Title', 'Description', 'DueDate', 'Points'])
+        for number in range(size):
+            writer.writerow([f"Unit {number % 5 + 1}", f"Quiz {number + 1}",
+                             'Benchmark quiz', '11/5/2025', 50])
+    try:
+        encoded_id = base64.b64encode(course_id.encode('utf-8')).decode()
+        create_quiz.create_quizzes(encoded_id, csv_file.name, 'UTC',
+                                   service=service)
+    finally:
+        os.remove(csv_file.name)
+
+
+def bench_csv_import(service, course_id, size):
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='',
+                                     delete=False) as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['Group', 'Title', 'DueDate', 'ScheduledDate',
+                         'Points'])
+        for number in range(size):
+            writer.writerow([f"Unit {number % 5 + 1}", f"Session {number + 1}",
+                             '11/5/2099', '11/3/2099', 100])
+    try:
+        outcomes = script.import_assignments(course_id, csv_file.name, 'UTC')
+    finally:
+        os.remove(csv_file.name)
+    created = sum(outcome['status'] == script.CREATED for outcome in outcomes)
+    if created != size:
+        raise RuntimeError(f"Imported {created} of {size} rows.")
+
+
+def bench_rename(service, course_id, size):
+    titles = {f"Session {number + 1}" for number in range(size)}
+    summary = rename_assignments.rename_course_assignments(course_id, titles,
+                                                           '[BD] ')
+    if summary is None or summary['renamed'] != size:
+        raise RuntimeError(f"Rename finished with {summary}.")
+
+
+BENCHMARKS = {
+    'list_course_work': bench_list_course_work,
+    'update_course_work': bench_update_course_work,
+    'bulk_edit': bench_bulk_edit,
+    'csv_create': bench_csv_create,
+    'csv_import': bench_csv_import,
+    'rename': bench_rename,
+}
+
+
+def run_one(server, creds, name, size, args):
+    bench = BENCHMARKS[name]
+    # Creation starts from an empty course; everything else edits `size`
+    # existing assignments.
+    initial = 0 if name in ('csv_create', 'csv_import') else size
+    state, course_id = _fresh_course(server, initial, args.latency_ms / 1000.0,
+                                     args.page_size, args.error_rate)
+    service = gcs.build_classroom_service(creds)
+    stats_before = gcs.get_request_stats()
+    with gcs.bound_credentials(creds):
+        # Warm nothing: every run starts with empty coursework and topic caches.
+        gcs.invalidate_course_work(course_id)
+        gcs.invalidate_topic_index(course_id)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            bench(service, course_id, size)
+        elapsed = time.perf_counter() - start
+    stats_after = gcs.get_request_stats()
+    return {
+        'benchmark': name,
+        'size': size,
+        'seconds': round(elapsed, 6),
+        'items_per_second': round(size / elapsed, 2) if elapsed else None,
+        'http_requests': state.http_requests,
+        'api_calls': state.api_calls,
+        'injected_errors': state.injected_errors,
+        'client_requests': {
+            stat: stats_after.get(stat, 0) - stats_before.get(stat, 0)
+            for stat in stats_after
+        },
+        'latency_ms': args.latency_ms,
+        'page_size': args.page_size,
+        'error_rate': args.error_rate,
+    }
+
+
+def main(argv=None):
+    global gcs, app_module, create_quiz, rename_assignments, script
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated assignment counts.")
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS),
+                        help="Comma-separated benchmark names.")
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help="Latency added to every HTTP request.")
+    parser.add_argument('--page-size', type=int, default=30,
+                        help="Default page size of the fake server.")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Fraction of API calls answered with a 429.")
+    parser.add_argument('--output', help="Write JSON results to this file.")
+    args = parser.parse_args(argv)
+
+    server = FakeClassroomServer(ClassroomState()).start()
+    os.environ['CLASSROOM_ROOT_URL'] = server.root_url
+    # Keep checkpoints and mirrored coursework of benchmark runs out of the
+    # real journal and mirror.
+    journal_dir = tempfile.mkdtemp()
+    os.environ['CLASSROOM_JOURNAL_PATH'] = os.path.join(journal_dir,
+                                                        'checkpoints.db')
+    os.environ['CLASSROOM_MIRROR_PATH'] = os.path.join(journal_dir,
+                                                       'mirror.db')
+    import google_classroom_service as gcs_module
+    import app as app_module_
+    import create_quiz as create_quiz_module
+    import rename_assignments as rename_module
+    import script as script_module
+    gcs, app_module = gcs_module, app_module_
+    create_quiz, rename_assignments = create_quiz_module, rename_module
+    script = script_module
+    # Injected 429s carry Retry-After: 0; keep jittered backoff short too.
+    gcs.RETRY_BASE_DELAY_SECONDS = 0.01
+
+    from google.oauth2.credentials import Credentials
+    creds = Credentials(token='fake-benchmark-token')
+
+    results = []
+    try:
+        for name in args.benchmarks.split(','):
+            for size in (int(size) for size in args.sizes.split(',')):
+                result = run_one(server, creds, name, size, args)
+                results.append(result)
+                print(f"{name:>20} {size:>6}: {result['seconds']:9.3f}s "
+                      f"{result['http_requests']:>6} HTTP requests",
+                      file=sys.stderr)
+    finally:
+        server.stop()
+        shutil.rmtree(journal_dir, ignore_errors=True)
+
+    payload = json.dumps({'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
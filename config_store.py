@@ -0,0 +1,129 @@
+"""Cached, atomically written store for schedule_config.json.
+
+The schedule configuration is read far more often than it is written (every
+schedule page view, every import that resolves session dates), and the web
+app may run as several worker processes. ScheduleConfigStore keeps the
+parsed file in memory and only re-reads it when its inode, size or mtime
+change, so repeated reads cost one stat(). Writes go to a temporary file in
+the same directory that is renamed over the config, under an exclusive
+lock file, so readers in other processes see either the old or the new
+file, never a half-written one.
+"""
+import json
+import os
+import tempfile
+import threading
+
+import school_calendar
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, writes stay atomic.
+    fcntl = None
+
+CONFIG_FILE_PATH = os.environ.get('SCHEDULE_CONFIG_PATH',
+                                  'schedule_config.json')
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _signature(path):
+    """Returns what identifies a version of the file, or None if missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class ScheduleConfigStore:
+    """The schedule configuration at path, shared by every thread."""
+
+    def __init__(self, path=CONFIG_FILE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._config = {}
+        self._schedules = {}
+        self._calendars = {}
+
+    def _refresh(self):
+        """Re-reads the file if it changed; raises ValueError if corrupt."""
+        signature = _signature(self.path)
+        if signature == self._signature:
+            return
+        with self._lock:
+            signature = _signature(self.path)
+            if signature == self._signature:
+                return
+            config = {}
+            if signature is not None:
+                try:
+                    with open(self.path, 'r') as f:
+                        config = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise ValueError(
+                        f"{self.path} is corrupted: {str(e)}"
+                    ) from e
+            self._publish(config, signature)
+
+    def _publish(self, config, signature):
+        self._config = config
+        self._schedules = {schedule.get('course_id'): schedule
+                           for schedule in config.get('course_schedules', [])}
+        self._calendars = {}
+        self._signature = signature
+
+    def load(self):
+        """Returns the configuration dict ({} if none); do not modify it."""
+        self._refresh()
+        return self._config
+
+    def course_schedule(self, course_id):
+        """Returns the course's schedule entry, or None."""
+        self._refresh()
+        return self._schedules.get(course_id)
+
+    def calendar(self, course_id, timezone_str='UTC'):
+        """Returns the course's CourseCalendar, or None if unscheduled.
+
+        Calendars are built once per version of the file.
+        """
+        self._refresh()
+        calendars = self._calendars
+        key = (course_id, timezone_str)
+        if key not in calendars:
+            calendars[key] = school_calendar.schedule_calendar(
+                self._config, self._schedules.get(course_id), timezone_str
+            )
+        return calendars[key]
+
+    def save(self, config):
+        """Replaces the configuration file atomically."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self._lock, open(self.path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            fd, temp_path = tempfile.mkstemp(
+                dir=directory, prefix='.schedule_config.', suffix='.tmp'
+            )
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(config, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            self._publish(config, _signature(self.path))
+
+
+def get_store(path=CONFIG_FILE_PATH):
+    """Returns the process-wide store for path."""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ScheduleConfigStore(path)
+        return _stores[path]
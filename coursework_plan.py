@@ -0,0 +1,189 @@
+"""Plans coursework edits as a minimal set of patches.
+
+A bulk change starts from a desired state (the bulk edit form, a CSV file,
+the output of a renaming rule) and the coursework as it currently is.
+plan_changes() joins the two on assignment id in one pass with pandas and
+keeps only the fields whose value really changes, so every patch carries
+exactly those fields and its update mask lists nothing else. Assignments
+that would not change are left out entirely. The plan can be shown as a
+dry run before plan_updates() turns it into
+gcs.batch_update_course_work() input.
+"""
+import pandas as pd
+
+# Fields the planner knows how to compare, in update mask order.
+PLANNED_FIELDS = ('title', 'dueDate', 'maxPoints')
+
+
+def _date_strings(year, month, day):
+    """Returns YYYY-MM-DD strings for date parts; '' where a part is missing."""
+    dates = pd.to_datetime(
+        pd.DataFrame({'year': year, 'month': month, 'day': day}),
+        errors='coerce'
+    )
+    return dates.dt.strftime('%Y-%m-%d').fillna('')
+
+
+def _current_frame(current):
+    """Returns current coursework as comparable columns, indexed by id."""
+    frame = pd.json_normalize(current) if current else pd.DataFrame()
+    frame = frame.reindex(columns=[
+        'id', 'title', 'maxPoints', 'dueDate.year', 'dueDate.month',
+        'dueDate.day'
+    ])
+    return pd.DataFrame({
+        'title': frame['title'].fillna('').astype(str),
+        'dueDate': _date_strings(frame['dueDate.year'],
+                                 frame['dueDate.month'],
+                                 frame['dueDate.day']),
+        'maxPoints': pd.to_numeric(frame['maxPoints'], errors='coerce'),
+    }).set_axis(frame['id'].astype(str))
+
+
+def _desired_frame(desired, fields):
+    """Returns desired values as comparable columns plus error messages.
+
+    Empty values ('' or None) mean "clear the field".
+    """
+    frame = pd.DataFrame(desired).reindex(columns=['id', *fields])
+    frame['id'] = frame['id'].astype(str)
+    frame = frame.set_index('id')
+    errors = pd.Series('', index=frame.index)
+    normalized = pd.DataFrame(index=frame.index)
+
+    if 'title' in fields:
+        titles = frame['title'].fillna('').astype(str)
+        errors = errors.mask((errors == '') & (titles.str.strip() == ''),
+                             "Title cannot be empty.")
+        normalized['title'] = titles
+
+    if 'dueDate' in fields:
+        raw = frame['dueDate'].fillna('').astype(str).str.strip()
+        parsed = pd.to_datetime(raw, format='%Y-%m-%d', errors='coerce')
+        errors = errors.mask((errors == '') & parsed.isna() & (raw != ''),
+                             "Invalid due date: '" + raw + "'.")
+        normalized['dueDate'] = parsed.dt.strftime('%Y-%m-%d').fillna('')
+
+    if 'maxPoints' in fields:
+        raw = frame['maxPoints'].fillna('').astype(str).str.strip()
+        points = pd.to_numeric(raw, errors='coerce')
+        errors = errors.mask((errors == '') & points.isna() & (raw != ''),
+                             "Invalid points: '" + raw + "'.")
+        errors = errors.mask((errors == '') & (points < 0),
+                             "Points must not be negative.")
+        normalized['maxPoints'] = points
+
+    return normalized, errors
+
+
+def _body_value(field, value):
+    """Converts a normalized value back into the Classroom API form."""
+    if field == 'title':
+        return value
+    if field == 'dueDate':
+        if not value:
+            return None
+        year, month, day = map(int, value.split('-'))
+        return {'year': year, 'month': month, 'day': day}
+    if pd.isna(value):
+        return None
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def plan_changes(current, desired, fields=None):
+    """Diffs the desired state against current coursework.
+
+    current is a list of coursework items as returned by Classroom (at
+    least id and the planned fields). desired is a list of dicts (or a
+    DataFrame) with an 'id' and a value for each planned field; an empty
+    value clears the field, and dueDate is given as YYYY-MM-DD. fields
+    defaults to the PLANNED_FIELDS present in desired.
+
+    Returns a dict with:
+      'changes': one dict per assignment that changes, with its 'id',
+          current 'title', the patch 'body' and 'mask', and the 'before'
+          and 'after' values of each changed field;
+      'unchanged': ids whose desired state matches Classroom;
+      'unknown': ids that are not in current;
+      'errors': (id, message) pairs for invalid desired values.
+    """
+    desired = pd.DataFrame(desired)
+    if fields is None:
+        fields = [field for field in PLANNED_FIELDS if field in desired]
+    fields = [field for field in PLANNED_FIELDS if field in fields]
+    plan = {'changes': [], 'unchanged': [], 'unknown': [], 'errors': []}
+    if desired.empty:
+        return plan
+
+    wanted, errors = _desired_frame(desired, fields)
+    known = _current_frame(current)
+    plan['unknown'] = [item_id for item_id in wanted.index
+                       if item_id not in known.index]
+    joined = wanted.join(known, how='inner', lsuffix='_new', rsuffix='_old')
+    errors = errors.reindex(joined.index)
+    plan['errors'] = [(item_id, message)
+                      for item_id, message in errors.items() if message]
+
+    changed = pd.DataFrame(index=joined.index)
+    for field in fields:
+        new, old = joined[f'{field}_new'], joined[f'{field}_old']
+        same = (new == old) | (new.isna() & old.isna())
+        changed[field] = ~same & (errors == '')
+
+    any_change = changed.any(axis=1)
+    plan['unchanged'] = list(joined.index[~any_change & (errors == '')])
+    for item_id in joined.index[any_change]:
+        row = joined.loc[item_id]
+        mask = [field for field in fields if changed.at[item_id, field]]
+        plan['changes'].append({
+            'id': item_id,
+            'title': row['title_old'] if 'title_old' in row else '',
+            'mask': ','.join(mask),
+            'body': {field: _body_value(field, row[f'{field}_new'])
+                     for field in mask},
+            'before': {field: _body_value(field, row[f'{field}_old'])
+                       for field in mask},
+            'after': {field: _body_value(field, row[f'{field}_new'])
+                      for field in mask},
+        })
+    return plan
+
+
+def plan_updates(plan):
+    """Returns the plan's patches as (id, body, update mask) tuples."""
+    return [(change['id'], change['body'], change['mask'])
+            for change in plan['changes']]
+
+
+def date_string(due_date):
+    """Returns a Classroom date dict as YYYY-MM-DD, or '' if incomplete."""
+    if not due_date or not all(due_date.get(k) for k in
+                               ('year', 'month', 'day')):
+        return ''
+    return f"{due_date['year']}-{due_date['month']:02d}-{due_date['day']:02d}"
+
+
+def describe_value(field, value):
+    """Formats a planned value for previews."""
+    if value is None:
+        return '(none)'
+    if field == 'dueDate':
+        return date_string(value)
+    return str(value)
+
+
+def print_plan(plan):
+    """Prints a dry-run preview of the plan."""
+    for change in plan['changes']:
+        details = '; '.join(
+            f"{field}: {describe_value(field, change['before'][field])} -> "
+            f"{describe_value(field, change['after'][field])}"
+            for field in change['mask'].split(',')
+        )
+        print(f"{change['title']} ({change['id']}): {details}")
+    for item_id, message in plan['errors']:
+        print(f"Error for {item_id}: {message}")
+    for item_id in plan['unknown']:
+        print(f"Unknown assignment ID: {item_id}")
+    print(f"{len(plan['changes'])} to update, "
+          f"{len(plan['unchanged'])} unchanged.")
@@ -1,18 +1,21 @@
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-import pandas as pd
+import google_classroom_service as gcs
+import csv_validation
+import fanout
+import jobs
+import journal
 import os.path
 import pickle
 import base64
-from datetime import datetime
-import pytz
+import sys
 
 
 # Configuration Constants
 ENCODED_COURSE_ID = "682514164930"  # Math course
 TIMEZONE = "America/Los_Angeles"  # Your timezone
 CSV_FILE = "quiz_structure.csv"  # Your CSV file name
+REQUIRED_COLUMNS = ('Group', 'Title', 'DueDate', 'Points')
 
 
 # Google Classroom API Scopes
@@ -58,37 +61,6 @@ def decode_course_id(encoded_id):
         return encoded_id
 
 
-def create_or_get_topic(service, course_id, topic_name):
-    """Creates a topic if it doesn't exist, or gets the existing topic ID."""
-    try:
-        topics = service.courses().topics().list(courseId=course_id).execute()
-        
-        for topic in topics.get('topic', []):
-            if topic['name'] == topic_name:
-                return topic['topicId']
-
-        topic = {'name': topic_name}
-        created_topic = service.courses().topics().create(
-            courseId=course_id,
-            body=topic
-        ).execute()
-        return created_topic['topicId']
-    except Exception as e:
-        print(f"Error with topic '{topic_name}': {str(e)}")
-        return None
-
-
-def parse_date(date_str):
-    """Parses date string in the format M/D/YYYY to datetime object."""
-    try:
-        return datetime.strptime(date_str, '%m/%d/%Y')
-    except ValueError:
-        try:
-            return datetime.strptime(date_str, '%Y-%m-%d')
-        except ValueError:
-            raise ValueError(f"Unsupported date format: {date_str}")
-
-
 def create_quiz(service, course_id, title, description, points, due_date,
                topic_id=None, materials=None):
     """Creates a quiz in Google Classroom."""
@@ -116,10 +88,12 @@ def create_quiz(service, course_id, title, description, points, due_date,
         if materials:
             quiz['materials'] = materials
 
-        created_quiz = service.courses().courseWork().create(
-            courseId=course_id,
-            body=quiz
-        ).execute()
+        created_quiz = gcs.execute_request(
+            service.courses().courseWork().create(
+                courseId=course_id,
+                body=quiz
+            )
+        )
 
         print(f"Created quiz: {title}")
         return created_quiz
@@ -128,68 +102,149 @@ def create_quiz(service, course_id, title, description, points, due_date,
         return None
 
 
-def create_quizzes(encoded_course_id, csv_file, timezone_str='UTC'):
-    """Creates quizzes in Google Classroom from a CSV file."""
-    course_id = decode_course_id(encoded_course_id)
-    print(f"Using decoded course ID: {course_id}")
-    
-    df = pd.read_csv(csv_file)
-    
-    creds = get_credentials()
-    service = build('classroom', 'v1', credentials=creds)
+def load_quiz_rows(csv_file):
+    """Validates csv_file and returns the rows to create, or None.
+
+    The rejects report is printed before any Classroom request is made.
+    """
+    try:
+        rows, rejects = csv_validation.prepare_rows(
+            csv_validation.read_csv(csv_file, REQUIRED_COLUMNS)
+        )
+    except ValueError as e:
+        print(f"Error reading {csv_file}: {str(e)}")
+        return None
+    csv_validation.print_rejects(rejects)
+    print(f"{len(rows)} quizzes to create, "
+          f"{len(rejects)} rows skipped or rejected.")
+    return rows
+
+
+def create_course_quizzes(course_id, rows, service=None):
+    """Creates a quiz in the course for each row from load_quiz_rows.
+
+    Must run with credentials bound (see gcs.bound_credentials); service
+    defaults to one built from them. Progress is checkpointed in the
+    journal, so running the same rows against the course again after an
+    interruption only creates the quizzes still missing. Returns the number
+    of quizzes created, failed and already created by an earlier run.
+    Raises RuntimeError if the course could not be accessed.
+    """
+    if service is None:
+        service = gcs.get_classroom_service()
     
     try:
-        course = service.courses().get(id=course_id).execute()
+        course = gcs.execute_request(service.courses().get(id=course_id))
         print(f"Successfully accessed course: {course.get('name', 'Unknown')}")
     except Exception as e:
-        print(f"Error accessing course: {str(e)}")
-        return
+        raise RuntimeError(f"Could not access course {course_id}: {e}") from e
+
+    # Look up every topic once and create the missing ones in one pass.
+    try:
+        topics = gcs.ensure_topics(course_id, rows['Group'].unique())
+    except Exception as e:
+        print(f"Error loading topics: {str(e)}")
+        topics = {}
     
-    for _, row in df.iterrows():
-        if row['DueDate'] in ['N/A', '—']:
-            print(f"Skipping {row['Title']} as it has N/A dates")
+    records = rows.to_dict('records')
+    run = journal.get_journal().open_run(
+        'create_quiz', course_id, jobs.make_fingerprint(course_id, records),
+        rows['line']
+    )
+    completed = run.completed()
+    if completed:
+        print(f"Resuming: {len(completed)} quizzes were created by an "
+              f"earlier run.")
+
+    pending = []
+    for row in records:
+        if str(row['line']) in completed:
             continue
-            
-        if row['Points'] in ['—', 'N/A']:
-            print(f"Skipping {row['Title']} as it has no points")
-            continue
-
-        topic_id = create_or_get_topic(service, course_id, row['Group'])
-        
+        materials = []
+        if row.get('FormURL'):
+            materials.append({
+                'form': {
+                    'formUrl': row['FormURL'],
+                    'title': row['Title'],
+                    'thumbnailUrl': None
+                }
+            })
+
+        points = row['Points']
+        future = gcs.submit_write(
+            create_quiz,
+            service=service,
+            course_id=course_id,
+            title=row['Title'],
+            description=row.get('Description', ''),
+            points=int(points) if points.is_integer() else points,
+            due_date=row['DueDate'],
+            topic_id=topics.get(row['Group']),
+            materials=materials if materials else None
+        )
+        pending.append((row['line'], row['Title'], future))
+
+    # create_quiz reports its own errors; wait for every create to finish.
+    summary = {'created': 0, 'failed': 0, 'resumed': len(completed)}
+    for line, title, future in pending:
         try:
-            due_date = parse_date(row['DueDate'])
-            materials = []
-            
-            if 'FormURL' in row and pd.notna(row['FormURL']):
-                materials.append({
-                    'form': {
-                        'formUrl': row['FormURL'],
-                        'title': row['Title'],
-                        'thumbnailUrl': None
-                    }
-                })
-
-            create_quiz(
-                service=service,
-                course_id=course_id,
-                title=row['Title'],
-                description=row.get('Description', ''),
-                points=int(row['Points']),
-                due_date=due_date,
-                topic_id=topic_id,
-                materials=materials if materials else None
-            )
+            created = future.result()
         except Exception as e:
-            print(f"Error creating quiz '{row['Title']}': {str(e)}")
+            print(f"Error creating quiz '{title}': {str(e)}")
+            created = None
+        if created:
+            run.mark_done(line, created.get('id'))
+            summary['created'] += 1
+        else:
+            run.mark_failed(line, "Quiz could not be created.")
+            summary['failed'] += 1
+    run.finish()
+    return summary
+
+
+def create_quizzes(encoded_course_id, csv_file, timezone_str='UTC',
+                   service=None):
+    """Creates quizzes in Google Classroom from a CSV file.
+
+    Must run with credentials bound (see gcs.bound_credentials); service
+    defaults to one built from them.
+    """
+    course_id = decode_course_id(encoded_course_id)
+    print(f"Using decoded course ID: {course_id}")
+    
+    # Validate the whole file before any Classroom request is made.
+    rows = load_quiz_rows(csv_file)
+    if rows is None:
+        return None
+    summary = create_course_quizzes(course_id, rows, service)
+    print(f"Classroom request stats: {gcs.get_request_stats()}")
+    return summary
 
 
 def main():
-    print(f"\nUsing course ID: {ENCODED_COURSE_ID}")
+    # Course selectors on the command line (encoded course ids, 'all' or
+    # 'name:<pattern>') replace ENCODED_COURSE_ID.
+    selector = fanout.parse_selector(sys.argv[1:] or [ENCODED_COURSE_ID])
+    if selector.get('course_ids'):
+        selector['course_ids'] = [decode_course_id(encoded_id)
+                                  for encoded_id in selector['course_ids']]
+    print(f"\nUsing courses: {selector or 'all'}")
     print(f"Using timezone: {TIMEZONE}")
     print("Starting quiz creation...\n")
-    
-    create_quizzes(ENCODED_COURSE_ID, CSV_FILE, TIMEZONE)
+
+    rows = load_quiz_rows(CSV_FILE)
+    if rows is None:
+        return
+    creds = get_credentials()
+    with gcs.bound_credentials(creds):
+        courses = fanout.select_courses(**selector)
+    outcomes = fanout.run_across_courses(
+        creds, courses,
+        lambda course_id: create_course_quizzes(course_id, rows)
+    )
+    fanout.print_summary(outcomes)
+    print(f"Classroom request stats: {gcs.get_request_stats()}")
 
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,128 @@
+"""Vectorized validation and normalization of the bulk-import CSV files.
+
+create_quiz.py and script.py both read spreadsheets of Group, Title, dates
+and Points. Rather than checking each row in Python, prepare_rows() works
+on whole columns with pandas: dates in M/D/YYYY or YYYY-MM-DD are parsed in
+one pass, placeholder rows are masked, points are coerced to numbers, and
+the result is split into a typed frame of importable rows and a rejects
+report, before any Classroom request is made.
+"""
+import pandas as pd
+
+# Cell values meaning "not set".
+PLACEHOLDERS = ('', 'N/A', '—')
+DATE_FORMATS = ('%m/%d/%Y', '%Y-%m-%d')
+# Number of rows validated at a time by iter_prepared_rows().
+CHUNK_ROWS = 5000
+
+# Row outcomes recorded in the rejects report.
+SKIPPED = 'skipped'
+REJECTED = 'rejected'
+REPORT_COLUMNS = ['line', 'title', 'status', 'message']
+
+
+def read_csv(csv_file, required_columns, chunksize=None):
+    """Reads csv_file as strings, or an iterator of chunks with chunksize.
+
+    Cells are kept as text (so '007' or 'N/A' survive for validation) and a
+    leading byte order mark is dropped. Raises ValueError if a required
+    column is missing.
+    """
+    options = {'dtype': str, 'keep_default_na': False,
+               'encoding': 'utf-8-sig', 'skipinitialspace': True}
+    columns = pd.read_csv(csv_file, nrows=0, **options).columns
+    missing = [column for column in required_columns
+               if column not in columns]
+    if missing:
+        raise ValueError(
+            f"{csv_file} is missing columns: {', '.join(missing)}"
+        )
+    return pd.read_csv(csv_file, chunksize=chunksize, **options)
+
+
+def parse_dates(values):
+    """Parses a column of M/D/YYYY or YYYY-MM-DD strings; NaT if neither."""
+    parsed = pd.to_datetime(values, format=DATE_FORMATS[0], errors='coerce')
+    for date_format in DATE_FORMATS[1:]:
+        parsed = parsed.fillna(
+            pd.to_datetime(values, format=date_format, errors='coerce')
+        )
+    return parsed
+
+
+def prepare_rows(df, dates=('DueDate',), optional_dates=(),
+                 skip_if_missing=('DueDate', 'Points'), first_line=2,
+                 resolve_dates=parse_dates):
+    """Validates a frame of CSV rows and returns (rows, rejects).
+
+    Rows with a placeholder in any skip_if_missing column are skipped.
+    Rows with an empty Title, a date in dates or optional_dates that cannot
+    be parsed, or non-numeric or negative Points are rejected; only the
+    first problem of a row is reported. rows keeps the importable rows with
+    every date column parsed (NaT for an empty optional date), Points as
+    floats and the CSV line number in 'line'. rejects is a frame of
+    REPORT_COLUMNS. first_line is the CSV line of df's first row.
+    resolve_dates parses a date column; pass a
+    school_calendar.CourseCalendar's resolve to accept session dates.
+    """
+    df = df.fillna('').astype(str).apply(lambda column: column.str.strip())
+    df['line'] = range(first_line, first_line + len(df))
+
+    reasons = pd.Series('', index=df.index)
+    statuses = pd.Series('', index=df.index)
+
+    def flag(mask, status, message):
+        mask = mask & (reasons == '')
+        reasons[mask] = message if isinstance(message, str) \
+            else message[mask]
+        statuses[mask] = status
+
+    flag(df['Title'] == '', REJECTED, "Title is empty.")
+    for column in skip_if_missing:
+        flag(df[column].isin(PLACEHOLDERS), SKIPPED, f"{column} is not set.")
+
+    for column in (*dates, *optional_dates):
+        parsed = resolve_dates(df[column])
+        unparsed = parsed.isna() & ~df[column].isin(PLACEHOLDERS)
+        if column in dates:
+            unparsed |= parsed.isna()
+        flag(unparsed, REJECTED,
+             f"Unsupported {column} format: '" + df[column] + "'")
+        df[column] = parsed
+
+    if 'Points' in df:
+        points = pd.to_numeric(df['Points'], errors='coerce').astype(float)
+        flag(points.isna(), REJECTED,
+             "Points '" + df['Points'] + "' is not a number.")
+        flag(points < 0, REJECTED, "Points must not be negative.")
+        df['Points'] = points
+
+    invalid = reasons != ''
+    rejects = pd.DataFrame({
+        'line': df['line'][invalid],
+        'title': df['Title'][invalid],
+        'status': statuses[invalid],
+        'message': reasons[invalid]
+    }, columns=REPORT_COLUMNS)
+    return df[~invalid], rejects
+
+
+def iter_prepared_rows(csv_file, required_columns, chunksize=CHUNK_ROWS,
+                       **options):
+    """Yields (rows, rejects) for each chunk of csv_file.
+
+    Large files are validated CHUNK_ROWS at a time, so importing can start
+    before the whole file has been read. options are passed to
+    prepare_rows().
+    """
+    first_line = 2
+    for chunk in read_csv(csv_file, required_columns, chunksize=chunksize):
+        yield prepare_rows(chunk, first_line=first_line, **options)
+        first_line += len(chunk)
+
+
+def print_rejects(rejects):
+    """Prints the rejects report, one line per skipped or rejected row."""
+    for reject in rejects.itertuples(index=False):
+        print(f"Line {reject.line}: {reject.status} '{reject.title}' "
+              f"{reject.message}")
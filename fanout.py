@@ -0,0 +1,128 @@
+"""Runs one coursework operation across many courses.
+
+A department often keeps the same structure in several sections. The tools
+in this repo operate on one course at a time; this module picks the
+courses to work on (explicit ids, a name pattern, or every active course)
+and runs an operation for each of them concurrently, never more than
+MAX_PARALLEL_COURSES at once across the whole process, then collects the
+outcome per course.
+"""
+import fnmatch
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import google_classroom_service as gcs
+
+# Courses processed at the same time, process-wide. Each course's requests
+# still go through the shared write pool in google_classroom_service.
+MAX_PARALLEL_COURSES = int(os.environ.get('FANOUT_MAX_PARALLEL_COURSES', '4'))
+
+_course_executor = None
+_course_executor_lock = threading.Lock()
+
+
+def _get_course_executor():
+    global _course_executor
+    if _course_executor is None:
+        with _course_executor_lock:
+            if _course_executor is None:
+                _course_executor = ThreadPoolExecutor(
+                    max_workers=MAX_PARALLEL_COURSES,
+                    thread_name_prefix='classroom-course'
+                )
+    return _course_executor
+
+
+def parse_selector(values):
+    """Turns command-line style selector values into select_courses kwargs.
+
+    'all' selects every active course, 'name:<pattern>' selects courses by
+    name and anything else is taken as a course id. Raises ValueError for
+    selectors that mix ids and a name pattern.
+    """
+    if not values or list(values) == ['all']:
+        return {}
+    names = [value[len('name:'):] for value in values
+             if value.startswith('name:')]
+    course_ids = [value for value in values
+                  if value != 'all' and not value.startswith('name:')]
+    if len(names) > 1:
+        raise ValueError("Only one name pattern can be given.")
+    if names and course_ids:
+        raise ValueError("Select courses by ids or by name, not both.")
+    return {'course_ids': course_ids or None,
+            'name_pattern': names[0] if names else None}
+
+
+def select_courses(course_ids=None, name_pattern=None):
+    """Returns the courses to operate on, as course dicts.
+
+    With course_ids, those courses are returned in the given order; ids
+    missing from the user's active courses (e.g. archived ones) are kept
+    as {'id': ...}. With name_pattern, active courses whose name matches
+    the shell-style pattern (case-insensitive, e.g. 'Biology*') are
+    returned. With neither, every active course is. Must run with
+    credentials bound or in a request context.
+    """
+    if course_ids:
+        directory = gcs.get_course_directory()
+        by_id = directory['by_id'] if directory else {}
+        return [by_id.get(course_id, {'id': course_id})
+                for course_id in course_ids]
+
+    courses = gcs.list_courses()
+    if courses is None:
+        raise RuntimeError("Could not list courses.")
+    if name_pattern:
+        pattern = name_pattern.lower()
+        courses = [course for course in courses
+                   if fnmatch.fnmatchcase(course.get('name', '').lower(),
+                                          pattern)]
+    return courses
+
+
+def run_across_courses(creds, courses, operation, on_result=None):
+    """Runs operation(course_id) for every course and returns the results.
+
+    Each call runs on a course worker thread with creds bound, so it can
+    use the google_classroom_service helpers directly. Operations must not
+    fan out again themselves. If given, on_result(course_id, outcome) is
+    called as each course finishes. Returns a dict mapping each course id,
+    in the order of courses, to an outcome dict with the course 'name',
+    the operation's 'result', the 'error' message if it raised, and the
+    elapsed 'seconds'.
+    """
+    def run_one(course):
+        start = time.perf_counter()
+        outcome = {'name': course.get('name', course['id']),
+                   'result': None, 'error': None}
+        try:
+            with gcs.bound_credentials(creds):
+                outcome['result'] = operation(course['id'])
+        except Exception as e:
+            print(f"Error processing course {course['id']}: {e}")
+            outcome['error'] = str(e)
+        outcome['seconds'] = round(time.perf_counter() - start, 3)
+        if on_result is not None:
+            on_result(course['id'], outcome)
+        return outcome
+
+    executor = _get_course_executor()
+    futures = {course['id']: executor.submit(run_one, course)
+               for course in courses}
+    return {course_id: future.result()
+            for course_id, future in futures.items()}
+
+
+def print_summary(outcomes):
+    """Prints one line per course and the number of failed courses."""
+    print("\nPer-course results:")
+    for course_id, outcome in outcomes.items():
+        status = (f"ERROR {outcome['error']}" if outcome['error']
+                  else outcome['result'])
+        print(f"{outcome['name']} ({course_id}): {status} "
+              f"[{outcome['seconds']}s]")
+    failed = sum(1 for outcome in outcomes.values() if outcome['error'])
+    print(f"{len(outcomes) - failed} of {len(outcomes)} courses succeeded.")
@@ -1,10 +1,29 @@
 from google_auth_oauthlib.flow import Flow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import hashlib
+import httplib2
+import json
 import os  # Added os for environment variable
 import os.path
 import pickle
-from flask import session, url_for, request as flask_request
+import random
+import socket
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from flask import session, url_for, request as flask_request, \
+    has_request_context
+import metrics
+import session_store
 
 # For local development only, to allow HTTP for oauthlib.
 # In production, you MUST use HTTPS and not set this.
@@ -13,12 +32,104 @@ os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 # Google Classroom API Scopes
 SCOPES = [
     'https://www.googleapis.com/auth/classroom.courses',
-    'https://www.googleapis.com/auth/classroom.coursework.students'
+    'https://www.googleapis.com/auth/classroom.coursework.students',
+    'https://www.googleapis.com/auth/classroom.topics'
 ]
 
 TOKEN_PICKLE_PATH = 'token.pickle'
 CREDENTIALS_PATH = 'credentials.json'
 
+CLASSROOM_API_NAME = 'classroom'
+CLASSROOM_API_VERSION = 'v1'
+# Overrides the API root (e.g. http://127.0.0.1:8765/ for the local fake
+# Classroom server in benchmarks/); batch requests follow it too.
+CLASSROOM_ROOT_URL = os.environ.get('CLASSROOM_ROOT_URL')
+# Upper bound on distinct credentials we keep a built service object for.
+MAX_CACHED_SERVICES = 32
+
+_discovery_document = None
+_discovery_lock = threading.Lock()
+# Credentials bound to the current thread by bound_credentials().
+_bound = threading.local()
+# credentials id (see _credentials_id) -> credentials shared by all requests
+_credential_cache = {}
+_credential_cache_lock = threading.Lock()
+# credentials id -> lock held by the one thread refreshing that token
+_refresh_locks = {}
+# credentials key -> (access token the service was built with, service)
+_service_cache = OrderedDict()
+_service_cache_lock = threading.Lock()
+
+# The Classroom batch endpoint accepts at most 50 sub-requests per call.
+MAX_BATCH_SIZE = 50
+# Maximum number of write requests (or batches) in flight at once.
+MAX_IN_FLIGHT_REQUESTS = int(os.environ.get('CLASSROOM_MAX_IN_FLIGHT', '8'))
+
+_write_executor = None
+_write_executor_lock = threading.Lock()
+
+# Retry policy shared by every Classroom call. Quota (429) and server (5xx)
+# errors are retried with exponential backoff and full jitter, honouring
+# Retry-After when Classroom sends it; other errors fail immediately.
+# Creates (POST) may have succeeded despite a 5xx or timeout, so they are
+# only retried when Classroom certainly did not run them.
+MAX_RETRIES = int(os.environ.get('CLASSROOM_MAX_RETRIES', '5'))
+RETRY_BASE_DELAY_SECONDS = 1.0
+RETRY_MAX_DELAY_SECONDS = 64.0
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# 403 reasons that signal throttling rather than a permission problem.
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+_request_stats = Counter()
+_request_stats_lock = threading.Lock()
+
+# How long a user's course directory is served from memory before the
+# course list is fetched from Classroom again.
+COURSE_DIRECTORY_TTL_SECONDS = int(
+    os.environ.get('COURSE_DIRECTORY_TTL_SECONDS', '300')
+)
+# user key -> {'fetched_at': ..., 'courses': [...], 'by_id': {...}}
+_course_directories = {}
+_course_directory_lock = threading.Lock()
+
+# (user key, course id) -> {'fetched_at': ..., 'by_name': {...},
+# 'by_id': {...}}; served for COURSE_DIRECTORY_TTL_SECONDS like the course
+# directory and kept current by ensure_topics().
+_topic_indexes = {}
+_topic_indexes_lock = threading.Lock()
+# (user key, course id) -> lock held while missing topics are created, so
+# concurrent imports into one course do not create the same topic twice.
+_topic_create_locks = {}
+
+# Partial-response field selectors. The course list and summary coursework
+# views only need a handful of fields, so they skip materials, descriptions
+# and links. A profile of None fetches full resources.
+COURSE_DIRECTORY_FIELDS = (
+    'courses(id,name,section,descriptionHeading,courseState,updateTime),'
+    'nextPageToken'
+)
+# Items requested per page by the listing generators; 0 lets Classroom pick.
+LIST_PAGE_SIZE = int(os.environ.get('CLASSROOM_LIST_PAGE_SIZE', '0'))
+COURSE_WORK_FIELD_PROFILES = {
+    'full': None,
+    'summary': ('id,title,state,workType,topicId,dueDate,dueTime,maxPoints,'
+                'updateTime'),
+    # What the local mirror keeps: the summary plus the description shown
+    # on the edit page.
+    'mirror': ('id,title,description,state,workType,topicId,dueDate,'
+               'dueTime,maxPoints,updateTime'),
+}
+
+# Number of (user, course, profile) coursework lists kept in memory; the
+# least recently used list is dropped first.
+COURSE_WORK_CACHE_SIZE = int(os.environ.get('COURSE_WORK_CACHE_SIZE', '64'))
+# (user key, course id, field profile) -> list of coursework items
+_course_work_cache = OrderedDict()
+_course_work_cache_lock = threading.Lock()
+# Called as fn(user_key, course_id, item, profile) for every coursework
+# item written to or re-read from Classroom; see add_course_work_listener.
+_course_work_listeners = []
+
 
 def get_flow():
     """Creates and returns an OAuth Flow object."""
@@ -38,124 +149,763 @@ def get_flow():
         raise
 
 
-def get_credentials_from_session_or_pickle():
-    """Tries to get credentials from Flask session or token.pickle."""
-    creds = None
-    if 'credentials' in session:
-        creds_dict = session['credentials']
-        try:
-            creds = pickle.loads(creds_dict)
-        except TypeError:
-            from google.oauth2.credentials import Credentials
-            try:
-                creds = Credentials(**creds_dict)
-            except Exception as e:
-                print(f"Error loading credentials from session dict: {e}")
-                session.pop('credentials', None)
-
-    if creds and creds.valid:
-        if creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-                session['credentials'] = pickle.dumps(creds)
-                with open(TOKEN_PICKLE_PATH, 'wb') as token_file:
-                    pickle.dump(creds, token_file)
-            except Exception as e:
-                print(f"Error refreshing token from session/pickle: {e}")
-                session.pop('credentials', None)
-                if os.path.exists(TOKEN_PICKLE_PATH):
-                    os.remove(TOKEN_PICKLE_PATH)
-                creds = None
-        return creds
+@contextmanager
+def bound_credentials(creds):
+    """Makes this module use creds on the current thread.
+
+    Background jobs and command-line scripts run outside a Flask request, so
+    they bind the credentials captured when the work was submitted.
+    """
+    previous = getattr(_bound, 'creds', None)
+    _bound.creds = creds
+    try:
+        yield creds
+    finally:
+        _bound.creds = previous
+
+
+def _credentials_id(creds):
+    """Returns an opaque id for creds, safe to keep in the session cookie."""
+    key = repr(_credentials_key(creds)).encode('utf-8')
+    return hashlib.sha256(key).hexdigest()
+
+
+def _remember_credentials(creds):
+    """Puts creds in the process-level cache and returns their id."""
+    creds_id = _credentials_id(creds)
+    with _credential_cache_lock:
+        _credential_cache[creds_id] = creds
+        _refresh_locks.setdefault(creds_id, threading.Lock())
+    return creds_id
+
+
+def _save_token_pickle(creds):
+    with open(TOKEN_PICKLE_PATH, 'wb') as token_file:
+        pickle.dump(creds, token_file)
 
-    # If not in session or not valid, try token.pickle
+
+def _discard_credentials(creds_id):
+    """Drops credentials that can no longer be used, everywhere they live."""
+    with _credential_cache_lock:
+        _credential_cache.pop(creds_id, None)
+    if has_request_context():
+        session_id = session.pop('session_id', None)
+        if session_id:
+            session_store.get_session_store().delete(session_id)
+        session.pop('credentials_id', None)
     if os.path.exists(TOKEN_PICKLE_PATH):
-        with open(TOKEN_PICKLE_PATH, 'rb') as token_file:
-            creds = pickle.load(token_file)
-        if creds and creds.valid:
-            if creds.expired and creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                    # Save refreshed token
-                    with open(TOKEN_PICKLE_PATH, 'wb') as token_file_save:
-                        pickle.dump(creds, token_file_save)
-                    session['credentials'] = pickle.dumps(creds)  # Update session
-                except Exception as e:
-                    print(f"Error refreshing token from pickle: {e}")
-                    if os.path.exists(TOKEN_PICKLE_PATH):
-                        os.remove(TOKEN_PICKLE_PATH)  # Remove invalid pickle
-                    creds = None
+        os.remove(TOKEN_PICKLE_PATH)
+
+
+def _ensure_fresh(creds_id, creds):
+    """Returns usable credentials, refreshing them at most once at a time.
+
+    Only one thread refreshes a given user's token; the others wait on the
+    same lock and then see the refreshed credentials. The refreshed token is
+    written to the session store and token.pickle only when it actually
+    changed.
+    Returns None if the credentials are invalid and cannot be refreshed.
+    """
+    if creds.valid:
+        return creds
+    if not (creds.expired and creds.refresh_token):
+        _discard_credentials(creds_id)
+        return None
+
+    with _credential_cache_lock:
+        refresh_lock = _refresh_locks.setdefault(creds_id, threading.Lock())
+    with refresh_lock:
+        if creds.valid:  # Another thread refreshed while we waited.
             return creds
-        elif creds and not creds.valid:  # Pickle exists, creds invalid, no refresh
-            if os.path.exists(TOKEN_PICKLE_PATH):
-                os.remove(TOKEN_PICKLE_PATH)
-            creds = None
-            
-    return None  # No valid credentials found
+        old_token = creds.token
+        try:
+            creds.refresh(Request())
+        except Exception as e:
+            print(f"Error refreshing token: {e}")
+            _discard_credentials(creds_id)
+            return None
+        if creds.token != old_token:
+            _save_token_pickle(creds)
+            if has_request_context() and session.get('session_id'):
+                session_store.get_session_store().put(session['session_id'],
+                                                      creds)
+    return creds
+
+
+def store_credentials(creds):
+    """Saves freshly obtained OAuth credentials for a new server session.
+
+    The session cookie only gets an opaque session id; the credentials go
+    to the server-side session store (see session_store).
+    """
+    creds_id = _remember_credentials(creds)
+    old_session_id = session.pop('session_id', None)
+    if old_session_id:
+        session_store.get_session_store().delete(old_session_id)
+    session_id = session_store.new_session_id()
+    session_store.get_session_store().put(session_id, creds)
+    session['session_id'] = session_id
+    session['credentials_id'] = creds_id
+    _save_token_pickle(creds)
+
+
+def forget_credentials():
+    """Removes the current session's credentials from memory and disk."""
+    creds_id = session.pop('credentials_id', None)
+    session_id = session.pop('session_id', None)
+    if session_id:
+        session_store.get_session_store().delete(session_id)
+    if creds_id:
+        with _credential_cache_lock:
+            _credential_cache.pop(creds_id, None)
+            _refresh_locks.pop(creds_id, None)
+    if os.path.exists(TOKEN_PICKLE_PATH):
+        os.remove(TOKEN_PICKLE_PATH)
+
+
+def _load_credentials_from_session_store():
+    """Loads the current session's credentials from the session store."""
+    session_id = session.get('session_id')
+    if not session_id:
+        return None
+    try:
+        return session_store.get_session_store().get(session_id)
+    except Exception as e:
+        print(f"Error loading credentials from session store: {e}")
+        return None
+
+
+def _load_credentials_from_pickle():
+    """Loads credentials from token.pickle, if it exists."""
+    if not os.path.exists(TOKEN_PICKLE_PATH):
+        return None
+    with open(TOKEN_PICKLE_PATH, 'rb') as token_file:
+        return pickle.load(token_file)
+
+
+def get_credentials_from_session_or_pickle():
+    """Returns valid credentials for the current user, or None.
+
+    Credentials are looked up in the process-level cache by the opaque id
+    kept in the session cookie. On a miss (the first request this worker
+    sees for the session) they are loaded from the server-side session
+    store, or from token.pickle, which then gets a new server session.
+    """
+    bound = getattr(_bound, 'creds', None)
+    if bound is not None:
+        return _ensure_fresh(_credentials_id(bound), bound)
+
+    # Sessions from before the server-side store carried pickled
+    # credentials; drop them so the cookie stays small.
+    session.pop('credentials', None)
+    with _credential_cache_lock:
+        creds = _credential_cache.get(session.get('credentials_id'))
+    if creds is None or not session.get('session_id'):
+        creds = _load_credentials_from_session_store()
+        if creds is None:
+            creds = _load_credentials_from_pickle()
+            if creds is None:
+                return None  # No valid credentials found
+            session['session_id'] = session_store.new_session_id()
+            session_store.get_session_store().put(session['session_id'],
+                                                  creds)
+        session['credentials_id'] = _remember_credentials(creds)
+    return _ensure_fresh(session['credentials_id'], creds)
+
+
+def _get_discovery_document():
+    """Returns the parsed Classroom discovery document.
+
+    The document ships with google-api-python-client, so it is read from the
+    installed package (never fetched over HTTP) and parsed once per process.
+    """
+    global _discovery_document
+    if _discovery_document is None:
+        with _discovery_lock:
+            if _discovery_document is None:
+                doc = get_static_doc(CLASSROOM_API_NAME, CLASSROOM_API_VERSION)
+                if doc is None:
+                    raise RuntimeError(
+                        f"No bundled discovery document for "
+                        f"{CLASSROOM_API_NAME} {CLASSROOM_API_VERSION}."
+                    )
+                document = json.loads(doc)
+                if CLASSROOM_ROOT_URL:
+                    document['rootUrl'] = CLASSROOM_ROOT_URL
+                _discovery_document = document
+    return _discovery_document
+
+
+def _credentials_key(creds):
+    """Returns a cache key identifying the user behind a set of credentials.
+
+    The refresh token survives access-token rotation, so it is preferred; the
+    access token is only used for credentials that cannot be refreshed.
+    """
+    return (getattr(creds, 'client_id', None),
+            getattr(creds, 'refresh_token', None) or creds.token)
+
+
+def _thread_local_request_builder(creds):
+    """Returns a requestBuilder giving each thread its own authorized Http.
+
+    httplib2.Http is not thread-safe, so a service object shared between
+    Flask's request threads must not share a single connection. Keeping one
+    Http per thread still reuses connections across requests on that thread.
+    """
+    local = threading.local()
+
+    def build_request(http, *args, **kwargs):
+        if getattr(local, 'http', None) is None:
+            local.http = AuthorizedHttp(creds, http=httplib2.Http())
+        return HttpRequest(local.http, *args, **kwargs)
+
+    return build_request
+
+
+def build_classroom_service(creds):
+    """Returns a cached Classroom service object for the given credentials.
+
+    Services are cached per user. When the user's access token rotates, the
+    stale service is evicted and rebuilt from the already parsed discovery
+    document.
+    """
+    key = _credentials_key(creds)
+    with _service_cache_lock:
+        cached = _service_cache.get(key)
+        if cached and cached[0] == creds.token:
+            _service_cache.move_to_end(key)
+            return cached[1]
+
+        service = build_from_document(
+            _get_discovery_document(),
+            credentials=creds,
+            requestBuilder=_thread_local_request_builder(creds)
+        )
+        _service_cache[key] = (creds.token, service)
+        _service_cache.move_to_end(key)
+        while len(_service_cache) > MAX_CACHED_SERVICES:
+            _service_cache.popitem(last=False)
+        return service
+
+
+def clear_service_cache(creds=None):
+    """Drops the cached service for creds, or every cached service."""
+    with _service_cache_lock:
+        if creds is None:
+            _service_cache.clear()
+        else:
+            _service_cache.pop(_credentials_key(creds), None)
 
 
 def get_classroom_service():
-    """Builds and returns a Google Classroom API service object."""
+    """Returns a Google Classroom API service object for the current user."""
     creds = get_credentials_from_session_or_pickle()
     if not creds:
         print("DEBUG: No valid creds in get_classroom_service. "
               "App should redirect to login.")
         return None
-    service = build('classroom', 'v1', credentials=creds)
-    return service
+    return build_classroom_service(creds)
 
 
-def list_courses():
-    """Lists all courses accessible by the user."""
+def _count(stat, amount=1):
+    with _request_stats_lock:
+        _request_stats[stat] += amount
+
+
+def get_request_stats():
+    """Returns counters for requests, retries and failures so far."""
+    with _request_stats_lock:
+        return dict(_request_stats)
+
+
+def _method_name(request):
+    """Returns the API method id of a request, e.g. classroom.courses.list."""
+    return getattr(request, 'methodId', None) or 'unknown'
+
+
+def _status_label(error):
+    """Returns the metrics status label for a request outcome."""
+    if error is None:
+        return '200'
+    if isinstance(error, HttpError):
+        return str(error.resp.status)
+    return type(error).__name__
+
+
+def is_idempotent(request):
+    """Tells whether sending a request twice is harmless.
+
+    Gets and patches are; creates (POST) are not, a second one would add
+    another copy.
+    """
+    return getattr(request, 'method', 'GET').upper() != 'POST'
+
+
+def is_retryable_error(error, idempotent=True):
+    """Tells whether a failed request is worth retrying.
+
+    Requests that are not idempotent are only retried after throttling
+    errors and connection errors raised before the request was sent; a 5xx
+    or a timeout may hide a write that went through.
+    """
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 429:
+            return True
+        if status in RETRYABLE_STATUSES:
+            return idempotent
+        if status == 403:
+            reasons = {detail.get('reason') for detail in
+                       (error.error_details or [])
+                       if isinstance(detail, dict)}
+            return bool(reasons & RATE_LIMIT_REASONS)
+        return False
+    if not idempotent:
+        return isinstance(error, (ConnectionRefusedError,
+                                  httplib2.ServerNotFoundError))
+    return isinstance(error, (socket.timeout, ConnectionError,
+                              httplib2.ServerNotFoundError))
+
+
+def _retry_after_seconds(error):
+    """Returns the delay requested by a Retry-After header, if any."""
+    resp = getattr(error, 'resp', None)
+    value = resp.get('retry-after') if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _retry_delay(error, attempt):
+    """Returns how long to wait before retry number attempt + 1."""
+    backoff = random.uniform(
+        0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+    )
+    retry_after = _retry_after_seconds(error)
+    if retry_after is not None:
+        return retry_after + backoff * 0.1
+    return backoff
+
+
+def execute_request(request):
+    """Executes a Classroom API request, retrying transient failures.
+
+    Every call in this module (and the command-line scripts) goes through
+    here, so throttling is handled the same way everywhere.
+    """
+    method = _method_name(request)
+    idempotent = is_idempotent(request)
+    attempt = 0
+    while True:
+        _count('requests')
+        start = time.perf_counter()
+        try:
+            response = request.execute()
+        except Exception as e:
+            metrics.CLASSROOM_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=method,
+                status=_status_label(e))
+            if (attempt >= MAX_RETRIES or
+                    not is_retryable_error(e, idempotent)):
+                _count('failures')
+                raise
+            delay = _retry_delay(e, attempt)
+            _count('retries')
+            metrics.CLASSROOM_RETRIES.inc(method=method)
+            print(f"Retrying request after {delay:.1f}s ({e}).")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        metrics.CLASSROOM_REQUEST_SECONDS.observe(
+            time.perf_counter() - start, method=method, status='200')
+        return response
+
+
+def get_write_executor():
+    """Returns the shared thread pool used for Classroom write operations."""
+    global _write_executor
+    if _write_executor is None:
+        with _write_executor_lock:
+            if _write_executor is None:
+                _write_executor = ThreadPoolExecutor(
+                    max_workers=MAX_IN_FLIGHT_REQUESTS,
+                    thread_name_prefix='classroom-write'
+                )
+    return _write_executor
+
+
+def set_max_in_flight_requests(max_in_flight):
+    """Changes the in-flight limit for writes submitted after this call.
+
+    Writes already submitted finish on the previous pool.
+    """
+    global _write_executor, MAX_IN_FLIGHT_REQUESTS
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1.")
+    with _write_executor_lock:
+        old_executor = _write_executor
+        MAX_IN_FLIGHT_REQUESTS = max_in_flight
+        _write_executor = None
+    if old_executor is not None:
+        old_executor.shutdown(wait=False)
+
+
+def submit_write(fn, *args, **kwargs):
+    """Runs fn(*args, **kwargs) on the write pool and returns its Future.
+
+    fn runs on a worker thread, outside the Flask request context, so it
+    must be given a service object rather than calling
+    get_classroom_service() itself.
+    """
+    return get_write_executor().submit(fn, *args, **kwargs)
+
+
+def current_user_key():
+    """Returns the cache key of the logged-in user, or None."""
+    creds = get_credentials_from_session_or_pickle()
+    return _credentials_key(creds) if creds else None
+
+
+def iter_courses(page_size=None, fields=COURSE_DIRECTORY_FIELDS):
+    """Yields the user's active courses page by page.
+
+    Pages are only requested as the caller consumes items, so a caller that
+    stops early never fetches the remaining pages. API errors propagate.
+    """
     service = get_classroom_service()
-    courses = []
+    page_size = LIST_PAGE_SIZE if page_size is None else page_size
     page_token = None
+    while True:
+        request = service.courses().list(
+            pageToken=page_token, courseStates=['ACTIVE'],
+            pageSize=page_size or None, fields=fields)
+        response = execute_request(request)
+        metrics.CLASSROOM_PAGES.inc(method=_method_name(request))
+        yield from response.get('courses', [])
+        page_token = response.get('nextPageToken', None)
+        if not page_token:
+            break
+
+
+def get_course_directory(refresh=False, fetch=True):
+    """Returns the current user's course directory.
+
+    The directory is a dict with the course list under 'courses' and the
+    same courses indexed by id under 'by_id'. It is served from memory for
+    COURSE_DIRECTORY_TTL_SECONDS unless refresh is True. With fetch=False,
+    only a directory already in memory is returned. Returns None if the
+    courses could not be listed.
+    """
+    user_key = current_user_key()
+    if user_key is None:
+        return None
+
+    with _course_directory_lock:
+        directory = _course_directories.get(user_key)
+    if (directory and not refresh and
+            time.monotonic() - directory['fetched_at'] <
+            COURSE_DIRECTORY_TTL_SECONDS):
+        return directory
+    if not fetch:
+        return None
+
     try:
-        while True:
-            response = service.courses().list(
-                pageToken=page_token, courseStates=['ACTIVE']).execute()
-            courses.extend(response.get('courses', []))
-            page_token = response.get('nextPageToken', None)
-            if not page_token:
-                break
+        courses = list(iter_courses())
     except Exception as e:
         print(f"An error occurred while listing courses: {e}")
         return None
-    return courses
+
+    directory = {
+        'fetched_at': time.monotonic(),
+        'courses': courses,
+        'by_id': {course['id']: course for course in courses}
+    }
+    with _course_directory_lock:
+        _course_directories[user_key] = directory
+    return directory
+
+
+def invalidate_course_directory():
+    """Forgets the current user's cached course directory."""
+    user_key = current_user_key()
+    with _course_directory_lock:
+        _course_directories.pop(user_key, None)
+
+
+def list_courses(refresh=False):
+    """Lists all courses accessible by the user."""
+    directory = get_course_directory(refresh=refresh)
+    if directory is None:
+        return None
+    return list(directory['courses'])
 
 
-def list_course_work(course_id):
-    """Lists all coursework for a given course."""
+def iter_topics(course_id, page_size=None):
+    """Yields a course's topics page by page. API errors propagate."""
     service = get_classroom_service()
+    page_size = LIST_PAGE_SIZE if page_size is None else page_size
+    page_token = None
+    while True:
+        request = service.courses().topics().list(
+            courseId=course_id, pageToken=page_token,
+            pageSize=page_size or None)
+        response = execute_request(request)
+        metrics.CLASSROOM_PAGES.inc(method=_method_name(request))
+        yield from response.get('topic', [])
+        page_token = response.get('nextPageToken', None)
+        if not page_token:
+            break
+
+
+def get_topic_index(course_id, refresh=False):
+    """Returns the current user's topic index for a course.
+
+    The index maps topic names to ids under 'by_name' and ids to names
+    under 'by_id'. It is built from every page of the course's topics and
+    served from memory for COURSE_DIRECTORY_TTL_SECONDS unless refresh is
+    True. When two topics share a name, the first one listed wins. API
+    errors propagate.
+    """
+    key = (current_user_key(), course_id)
+    with _topic_indexes_lock:
+        index = _topic_indexes.get(key)
+    if (index and not refresh and
+            time.monotonic() - index['fetched_at'] <
+            COURSE_DIRECTORY_TTL_SECONDS):
+        return index
+
+    index = {'fetched_at': time.monotonic(), 'by_name': {}, 'by_id': {}}
+    for topic in iter_topics(course_id):
+        index['by_name'].setdefault(topic['name'], topic['topicId'])
+        index['by_id'][topic['topicId']] = topic['name']
+    with _topic_indexes_lock:
+        _topic_indexes[key] = index
+    return index
+
+
+def _create_topic(service, course_id, name):
+    return execute_request(
+        service.courses().topics().create(courseId=course_id,
+                                          body={'name': name})
+    )
+
+
+def ensure_topics(course_id, names):
+    """Returns a name -> topic id dict for names, creating missing topics.
+
+    Missing topics are created concurrently on the write pool in a single
+    pass and added to the course's topic index. Topics that could not be
+    created are reported and left out of the result.
+    """
+    key = (current_user_key(), course_id)
+    names = {name for name in names if name}
+    with _topic_indexes_lock:
+        create_lock = _topic_create_locks.setdefault(key, threading.Lock())
+    with create_lock:
+        index = get_topic_index(course_id)
+        missing = names - index['by_name'].keys()
+        if missing:
+            service = get_classroom_service()
+            futures = {
+                name: submit_write(_create_topic, service, course_id, name)
+                for name in missing
+            }
+            created = {}
+            for name, future in futures.items():
+                try:
+                    created[name] = future.result()['topicId']
+                    print(f"Created topic: {name}")
+                except Exception as e:
+                    print(f"Error with topic '{name}': {str(e)}")
+            # Publish a new index rather than mutating one readers may hold.
+            index = {
+                'fetched_at': index['fetched_at'],
+                'by_name': {**index['by_name'], **created},
+                'by_id': {**index['by_id'],
+                          **{topic_id: name
+                             for name, topic_id in created.items()}}
+            }
+            with _topic_indexes_lock:
+                _topic_indexes[key] = index
+    return {name: index['by_name'][name] for name in names
+            if name in index['by_name']}
+
+
+def invalidate_topic_index(course_id):
+    """Forgets the current user's cached topic index for a course."""
+    with _topic_indexes_lock:
+        _topic_indexes.pop((current_user_key(), course_id), None)
+
+
+def _item_fields(profile):
+    """Returns the fields selector for a single coursework item."""
+    if profile not in COURSE_WORK_FIELD_PROFILES:
+        raise ValueError(f"Unknown coursework field profile: {profile}")
+    return COURSE_WORK_FIELD_PROFILES[profile]
+
+
+def _list_fields(profile):
+    """Returns the fields selector for a page of coursework."""
+    fields = _item_fields(profile)
+    return f"courseWork({fields}),nextPageToken" if fields else None
+
+
+def _get_cached_course_work(user_key, course_id, profile=None):
+    """Returns a cached coursework list for a course, or None.
+
+    With profile=None, the list cached under any profile is acceptable.
+    """
+    with _course_work_cache_lock:
+        for key in list(_course_work_cache):
+            if key[:2] == (user_key, course_id) and \
+                    profile in (None, key[2]):
+                _course_work_cache.move_to_end(key)
+                return _course_work_cache[key]
+        return None
+
+
+def _cache_course_work(user_key, course_id, profile, items):
+    """Stores a course's coursework list, evicting the least recently used."""
+    key = (user_key, course_id, profile)
+    with _course_work_cache_lock:
+        _course_work_cache[key] = items
+        _course_work_cache.move_to_end(key)
+        while len(_course_work_cache) > COURSE_WORK_CACHE_SIZE:
+            _course_work_cache.popitem(last=False)
+
+
+def add_course_work_listener(listener):
+    """Registers listener(user_key, course_id, item, profile).
+
+    It is called whenever this module writes a coursework item or re-reads
+    one to check its version, so stores kept outside this module (such as
+    the local mirror) can stay current without re-listing the course.
+    """
+    _course_work_listeners.append(listener)
+
+
+def _write_through_course_work(user_key, course_id, item, profile='full'):
+    """Replaces (or adds) one coursework item in the cached lists, if any.
+
+    A full item can stand in for any profile. A partial item only updates
+    lists of the same profile; richer lists for the course are dropped
+    because they would otherwise keep stale data. Registered listeners are
+    told about the item too.
+    """
+    for listener in _course_work_listeners:
+        try:
+            listener(user_key, course_id, item, profile)
+        except Exception as e:
+            print(f"Error in coursework listener: {e}")
+    with _course_work_cache_lock:
+        for key in list(_course_work_cache):
+            if key[:2] != (user_key, course_id):
+                continue
+            if profile != 'full' and key[2] != profile:
+                del _course_work_cache[key]
+                continue
+            items = _course_work_cache[key]
+            for position, cached_item in enumerate(items):
+                if cached_item.get('id') == item.get('id'):
+                    items[position] = item
+                    break
+            else:
+                items.append(item)
+
+
+def invalidate_course_work(course_id):
+    """Forgets the current user's cached coursework for a course."""
+    user_key = current_user_key()
+    with _course_work_cache_lock:
+        for key in list(_course_work_cache):
+            if key[:2] == (user_key, course_id):
+                del _course_work_cache[key]
+
+
+def iter_course_work(course_id, profile='full', page_size=None):
+    """Yields a course's coursework page by page.
+
+    Pages are only requested as the caller consumes items, so a caller that
+    stops early never fetches the remaining pages. When the listing runs to
+    the end, the complete list is cached as list_course_work would cache
+    it. API errors propagate to the caller.
+    """
+    user_key = current_user_key()
+    service = get_classroom_service()
+    page_size = LIST_PAGE_SIZE if page_size is None else page_size
     coursework_list = []
     page_token = None
+    while True:
+        request = service.courses().courseWork().list(
+            courseId=course_id,
+            pageToken=page_token,
+            pageSize=page_size or None,
+            courseWorkStates=['PUBLISHED', 'DRAFT'],  # Include drafts
+            fields=_list_fields(profile)
+        )
+        response = execute_request(request)
+        metrics.CLASSROOM_PAGES.inc(method=_method_name(request))
+        page = response.get('courseWork', [])
+        coursework_list.extend(page)
+        yield from page
+        page_token = response.get('nextPageToken', None)
+        if not page_token:
+            break
+    _cache_course_work(user_key, course_id, profile, coursework_list)
+
+
+def list_course_work(course_id, refresh=False, profile='full'):
+    """Lists all coursework for a given course.
+
+    profile names an entry of COURSE_WORK_FIELD_PROFILES; 'summary' fetches
+    only the fields the course and bulk edit views display. The list is
+    cached per user, course and profile and kept current by the write
+    functions in this module; pass refresh=True to re-list from Classroom.
+    """
+    if not refresh:
+        cached = get_cached_course_work(course_id, profile)
+        if cached is not None:
+            return cached
+
     try:
-        while True:
-            response = service.courses().courseWork().list(
-                courseId=course_id,
-                pageToken=page_token,
-                courseWorkStates=['PUBLISHED', 'DRAFT']  # Include drafts
-            ).execute()
-            coursework_list.extend(response.get('courseWork', []))
-            page_token = response.get('nextPageToken', None)
-            if not page_token:
-                break
+        return list(iter_course_work(course_id, profile=profile))
     except Exception as e:
         msg = (f"An error occurred while listing coursework for course "
                f"{course_id}: {e}")
         print(msg)
         return None
-    return coursework_list
 
 
-def get_course_work_item(course_id, assignment_id):
+def get_cached_course_work(course_id, profile='full'):
+    """Returns a copy of the cached coursework list, or None if not cached."""
+    cached = _get_cached_course_work(current_user_key(), course_id, profile)
+    return list(cached) if cached is not None else None
+
+
+def get_course_work_item(course_id, assignment_id, profile='full'):
     """Gets a specific coursework item (assignment)."""
+    cached = _get_cached_course_work(current_user_key(), course_id, profile)
+    if cached is not None:
+        for item in cached:
+            if item.get('id') == assignment_id:
+                return item
+
     service = get_classroom_service()
     try:
-        assignment = service.courses().courseWork().get(
+        assignment = execute_request(service.courses().courseWork().get(
             courseId=course_id,
-            id=assignment_id
-        ).execute()
+            id=assignment_id,
+            fields=_item_fields(profile)
+        ))
         return assignment
     except Exception as e:
         print(f"Error fetching assignment {assignment_id} for course "
@@ -167,13 +917,18 @@ def update_course_work(course_id, assignment_id, assignment_body, update_mask):
     """Updates an existing coursework item (assignment)."""
     service = get_classroom_service()
     try:
-        updated_assignment = service.courses().courseWork().patch(
-            courseId=course_id,
-            id=assignment_id,
-            updateMask=update_mask,  # Fields to update, comma-separated
-            body=assignment_body
-        ).execute()
+        updated_assignment = execute_request(
+            service.courses().courseWork().patch(
+                courseId=course_id,
+                id=assignment_id,
+                updateMask=update_mask,  # Fields to update, comma-separated
+                body=assignment_body
+            )
+        )
         print(f"Assignment {assignment_id} updated successfully.")
+        _write_through_course_work(
+            current_user_key(), course_id, updated_assignment
+        )
         return updated_assignment
     except Exception as e:
         # It's useful to print the error here for server logs
@@ -186,11 +941,238 @@ def update_course_work(course_id, assignment_id, assignment_body, update_mask):
         raise
 
 
+def _execute_batch(service, indexed_items, make_request):
+    """Sends one batch request and collects the per-item results.
+
+    indexed_items holds at most MAX_BATCH_SIZE (position, item) pairs and
+    make_request(service, item) builds the sub-request for an item. The
+    sub-requests are built here, on the thread that executes the batch, so
+    they use that thread's Http. Sub-requests that fail with a retryable
+    error (see is_retryable_error) are resent in a new batch after a
+    backoff delay. Returns a dict
+    mapping each position to a (response, error) pair.
+    """
+    results = {}
+    pending = list(indexed_items)
+    attempt = 0
+    while pending:
+        round_results = {}
+
+        def callback(request_id, response, exception):
+            round_results[int(request_id)] = (response, exception)
+
+        batch = service.new_batch_http_request(callback=callback)
+        methods = {}
+        idempotent = {}
+        for position, item in pending:
+            sub_request = make_request(service, item)
+            methods[position] = _method_name(sub_request)
+            idempotent[position] = is_idempotent(sub_request)
+            batch.add(sub_request, request_id=str(position))
+        _count('requests', len(pending))
+        start = time.perf_counter()
+        batch_error = None
+        try:
+            batch.execute()
+        except Exception as e:
+            print(f"Error executing batch request: {e}")
+            batch_error = e
+            for position, _ in pending:
+                round_results.setdefault(position, (None, e))
+        metrics.CLASSROOM_REQUEST_SECONDS.observe(
+            time.perf_counter() - start, method='batch',
+            status=_status_label(batch_error))
+
+        retry = []
+        delay = 0.0
+        for position, item in pending:
+            response, error = round_results.get(
+                position, (None, RuntimeError("No response in batch."))
+            )
+            metrics.CLASSROOM_BATCH_ITEMS.inc(method=methods[position],
+                                              status=_status_label(error))
+            if (error is not None and attempt < MAX_RETRIES and
+                    is_retryable_error(error, idempotent[position])):
+                metrics.CLASSROOM_RETRIES.inc(method=methods[position])
+                retry.append((position, item))
+                delay = max(delay, _retry_delay(error, attempt))
+                continue
+            if error is not None:
+                _count('failures')
+            results[position] = (response, error)
+
+        if retry:
+            _count('retries', len(retry))
+            print(f"Retrying {len(retry)} batched request(s) after "
+                  f"{delay:.1f}s.")
+            time.sleep(delay)
+        pending = retry
+        attempt += 1
+    return results
+
+
+def is_not_found(error):
+    """Tells whether a request failed because the item does not exist."""
+    return isinstance(error, HttpError) and error.resp.status == 404
+
+
+def _run_batched(service, items, make_request, on_result=None):
+    """Runs one sub-request per item through the Classroom batch endpoint.
+
+    Items are grouped into batches of up to MAX_BATCH_SIZE sub-requests and
+    the batches are sent concurrently on the write pool. items may be a
+    generator: each batch is submitted as soon as its items have been
+    produced, so producing later items overlaps with sending earlier ones.
+    As each batch completes, on_result(position, response, error) is called
+    for its items. Returns a list of (response, error) pairs in the order of
+    items; exactly one of the two is None for each item.
+    """
+    indexed_items = []
+    futures = []
+    chunk = []
+    for indexed_item in enumerate(items):
+        indexed_items.append(indexed_item)
+        chunk.append(indexed_item)
+        if len(chunk) == MAX_BATCH_SIZE:
+            futures.append(
+                submit_write(_execute_batch, service, chunk, make_request)
+            )
+            chunk = []
+    if chunk:
+        futures.append(submit_write(_execute_batch, service, chunk,
+                                    make_request))
+    results = {}
+    for future in as_completed(futures):
+        batch_results = future.result()
+        results.update(batch_results)
+        if on_result is not None:
+            for position in sorted(batch_results):
+                on_result(position, *batch_results[position])
+    return [
+        results.get(position, (None, RuntimeError("No response in batch.")))
+        for position, _ in indexed_items
+    ]
+
+
+def batch_update_course_work(course_id, updates, on_result=None):
+    """Updates several coursework items through the Classroom batch endpoint.
+
+    updates is a list of (assignment_id, assignment_body, update_mask)
+    tuples. If given, on_result(assignment_id, updated_assignment, error) is
+    called as soon as each item's batch completes. Returns a list of
+    (assignment_id, updated_assignment, error) tuples in the order of
+    updates; exactly one of updated_assignment and error is None for each
+    item.
+    """
+    def make_request(service, update):
+        assignment_id, assignment_body, update_mask = update
+        return service.courses().courseWork().patch(
+            courseId=course_id,
+            id=assignment_id,
+            updateMask=update_mask,
+            body=assignment_body
+        )
+
+    def report(position, updated_assignment, error):
+        on_result(updates[position][0], updated_assignment, error)
+
+    results = _run_batched(get_classroom_service(), updates, make_request,
+                           report if on_result is not None else None)
+
+    user_key = current_user_key()
+    outcomes = []
+    for (assignment_id, _, _), (updated_assignment, error) in zip(
+            updates, results):
+        if error is not None:
+            print(f"Error updating assignment {assignment_id} for course "
+                  f"{course_id}: {error}")
+        else:
+            print(f"Assignment {assignment_id} updated successfully.")
+            _write_through_course_work(
+                user_key, course_id, updated_assignment
+            )
+        outcomes.append((assignment_id, updated_assignment, error))
+    return outcomes
+
+
+def batch_create_course_work(course_id, assignment_bodies, on_result=None):
+    """Creates several coursework items through the Classroom batch endpoint.
+
+    assignment_bodies may be a generator; batches are sent while it is
+    still being consumed. If given, on_result(position, created, error) is
+    called as soon as each item's batch completes. Returns a list of
+    (created, error) pairs in the order of assignment_bodies; exactly one
+    of the two is None for each item.
+    """
+    def make_request(service, assignment_body):
+        assignment_body.setdefault('workType', 'ASSIGNMENT')
+        return service.courses().courseWork().create(
+            courseId=course_id,
+            body=assignment_body
+        )
+
+    results = _run_batched(get_classroom_service(), assignment_bodies,
+                           make_request, on_result)
+
+    user_key = current_user_key()
+    for created, error in results:
+        if error is None:
+            _write_through_course_work(user_key, course_id, created)
+    return results
+
+
+def get_changed_course_work(course_id, versions):
+    """Finds coursework items modified since the given versions were read.
+
+    versions maps assignment ids to the updateTime seen when a form was
+    rendered. Every item is fetched, in batches: cached and mirrored copies
+    may predate an edit made directly in Classroom, so they cannot vouch
+    for the current version. Returns (changed, errors): changed maps each
+    changed assignment id to its current item, errors maps the ids that
+    could not be fetched to their error (see is_not_found for deleted
+    items).
+    """
+    user_key = current_user_key()
+    assignment_ids = list(versions)
+    if not assignment_ids:
+        return {}, {}
+
+    def make_request(service, assignment_id):
+        return service.courses().courseWork().get(
+            courseId=course_id, id=assignment_id,
+            fields=_item_fields('summary')
+        )
+
+    results = _run_batched(get_classroom_service(), assignment_ids,
+                           make_request)
+    changed, errors = {}, {}
+    for assignment_id, (item, error) in zip(assignment_ids, results):
+        if error is not None:
+            print(f"Error fetching assignment {assignment_id} for course "
+                  f"{course_id}: {error}")
+            errors[assignment_id] = error
+            continue
+        _write_through_course_work(user_key, course_id, item, 'summary')
+        if item.get('updateTime') != versions[assignment_id]:
+            changed[assignment_id] = item
+    return changed, errors
+
+
 def get_course_name(course_id):
-    """Helper function to get the name of a course by its ID."""
+    """Helper function to get the name of a course by its ID.
+
+    Courses in the cached directory are resolved without an API call. When
+    the directory is not loaded, or the course is not in it (e.g. archived
+    courses), only that one course is fetched instead of paging through
+    every course.
+    """
+    directory = get_course_directory(fetch=False)
+    if directory and course_id in directory['by_id']:
+        return directory['by_id'][course_id].get('name', course_id)
+
     service = get_classroom_service()
     try:
-        course = service.courses().get(id=course_id).execute()
+        course = execute_request(service.courses().get(id=course_id))
         return course.get('name')
     except Exception as e:
         print(f"Error fetching course name for ID {course_id}: {e}")
@@ -205,11 +1187,16 @@ def create_new_assignment(course_id, assignment_body):
         if 'workType' not in assignment_body:
             assignment_body['workType'] = 'ASSIGNMENT'
         
-        created_assignment = service.courses().courseWork().create(
-            courseId=course_id,
-            body=assignment_body
-        ).execute()
+        created_assignment = execute_request(
+            service.courses().courseWork().create(
+                courseId=course_id,
+                body=assignment_body
+            )
+        )
         print(f"Assignment '{created_assignment.get('title')}' created.")
+        _write_through_course_work(
+            current_user_key(), course_id, created_assignment
+        )
         return created_assignment
     except Exception as e:
         print(f"An error occurred while creating assignment: {e}")
@@ -0,0 +1,389 @@
+"""Background job queue for bulk Classroom operations.
+
+Bulk edits and imports can touch hundreds of assignments, which takes far
+longer than a proxy will keep a request open. Instead of running inline,
+a route submits a job and redirects to a progress page that polls
+job_status(). Jobs run on a small pool of daemon worker threads inside the
+process that accepted them, so no external broker is required.
+
+Job and item progress is written to SQLite (JOBS_PATH, by default the
+checkpoint journal's file), so any worker process of a multi-process
+server can report a job's progress, whichever one runs it. The process
+running a job refreshes its heartbeat every JOB_HEARTBEAT_SECONDS; an
+unfinished job whose heartbeat stopped (its process died) is shown as
+failed, and submitting the same job again starts a new one.
+"""
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+import journal
+
+# Number of jobs executed at the same time. Each job still spreads its
+# Classroom requests over the shared write pool in google_classroom_service.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+# Finished jobs are kept this long so their progress page stays readable.
+FINISHED_JOB_RETENTION_SECONDS = 3600
+JOBS_PATH = os.environ.get('CLASSROOM_JOBS_PATH', journal.JOURNAL_PATH)
+JOB_HEARTBEAT_SECONDS = int(os.environ.get('JOB_HEARTBEAT_SECONDS', '10'))
+# An unfinished job whose heartbeat is older than this is considered dead.
+JOB_DEAD_SECONDS = 3 * JOB_HEARTBEAT_SECONDS
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT,
+    fingerprint TEXT,
+    state TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    holder TEXT,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_fingerprint
+    ON jobs (owner, fingerprint, finished_at);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL REFERENCES jobs (job_id),
+    item_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    label TEXT,
+    status TEXT NOT NULL,
+    message TEXT,
+    PRIMARY KEY (job_id, item_key)
+);
+"""
+
+_store = None
+_store_lock = threading.Lock()
+_job_queue = queue.Queue()
+_workers = []
+_workers_lock = threading.Lock()
+_heartbeat_thread = None
+# Identifies this process as the holder of the jobs it runs.
+_holder = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+
+def _owner_key(owner):
+    """Returns the stored form of a job owner (a gcs user key)."""
+    if owner is None:
+        return None
+    return hashlib.sha256(repr(owner).encode('utf-8')).hexdigest()
+
+
+class JobStore:
+    """Job progress in SQLite, shared by every worker process."""
+
+    def __init__(self, path=JOBS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in
+                   self._db.execute('PRAGMA table_info(jobs)').fetchall()}
+        for column, kind in (('holder', 'TEXT'), ('heartbeat_at', 'REAL')):
+            if column not in columns:
+                self._db.execute(
+                    f"ALTER TABLE jobs ADD COLUMN {column} {kind}"
+                )
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def insert(self, job):
+        """Records a new job and its items.
+
+        If an unfinished job of the same owner with the job's fingerprint
+        is still alive (its process keeps beating), nothing is recorded
+        and that job's id is returned.
+        """
+        now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute('BEGIN IMMEDIATE')
+                if job.fingerprint is not None:
+                    rows = self._db.execute(
+                        "SELECT job_id FROM jobs WHERE owner IS ? AND "
+                        "fingerprint = ? AND finished_at IS NULL AND "
+                        "heartbeat_at > ? ORDER BY created_at DESC LIMIT 1",
+                        (_owner_key(job.owner), job.fingerprint,
+                         now - JOB_DEAD_SECONDS)
+                    ).fetchall()
+                    if rows:
+                        return rows[0][0]
+                self._db.execute(
+                    "INSERT INTO jobs (job_id, kind, owner, fingerprint, "
+                    "state, created_at, updated_at, holder, heartbeat_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job.id, job.kind, _owner_key(job.owner),
+                     job.fingerprint, job.state, job.created_at,
+                     job.created_at, _holder, now)
+                )
+                self._db.executemany(
+                    "INSERT INTO job_items (job_id, item_key, position, "
+                    "label, status, message) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(job.id, str(key), position, item['label'],
+                      item['status'], item['message'])
+                     for position, (key, item) in
+                     enumerate(job.items.items())]
+                )
+        return None
+
+    def save_item(self, job_id, key, item):
+        """Records an item's status; unknown items are appended."""
+        now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute('BEGIN')
+                self._db.execute(
+                    "INSERT INTO job_items (job_id, item_key, position, "
+                    "label, status, message) VALUES (?, ?, "
+                    "(SELECT COUNT(*) FROM job_items WHERE job_id = ?), "
+                    "?, ?, ?) ON CONFLICT (job_id, item_key) DO UPDATE "
+                    "SET status = excluded.status, "
+                    "message = excluded.message",
+                    (job_id, str(key), job_id, item['label'],
+                     item['status'], item['message'])
+                )
+                self._db.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE job_id = ?",
+                    (now, job_id)
+                )
+
+    def save_state(self, job):
+        """Records a job's state, error and finish time."""
+        self._execute(
+            "UPDATE jobs SET state = ?, error = ?, updated_at = ?, "
+            "finished_at = ? WHERE job_id = ?",
+            (job.state, job.error, time.time(), job.finished_at, job.id)
+        )
+
+    def load(self, job_id, owner):
+        """Returns the stored job if it belongs to owner, else None."""
+        rows = self._execute(
+            "SELECT kind, fingerprint, state, error, created_at, "
+            "heartbeat_at, finished_at FROM jobs "
+            "WHERE job_id = ? AND owner IS ?",
+            (job_id, _owner_key(owner))
+        )
+        if not rows:
+            return None
+        (kind, fingerprint, state, error, created_at, heartbeat_at,
+         finished_at), = rows
+        job = Job(kind, owner, {}, None, fingerprint)
+        job.id = job_id
+        job.state, job.error = state, error
+        job.created_at, job.finished_at = created_at, finished_at
+        for key, label, status, message in self._execute(
+                "SELECT item_key, label, status, message FROM job_items "
+                "WHERE job_id = ? ORDER BY position", (job_id,)):
+            job.items[key] = {'label': label, 'status': status,
+                              'message': message}
+        if (not job.finished and
+                (heartbeat_at or 0) < time.time() - JOB_DEAD_SECONDS):
+            job.state = FAILED
+            job.error = "The worker running this job stopped."
+        return job
+
+    def beat(self, holder):
+        """Refreshes the heartbeat of holder's unfinished jobs."""
+        self._execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE holder = ? AND "
+            "finished_at IS NULL",
+            (time.time(), holder)
+        )
+
+    def prune(self, cutoff):
+        """Deletes jobs finished, or last heard of, before cutoff."""
+        with self._lock:
+            with self._db:
+                self._db.execute('BEGIN')
+                stale = "SELECT job_id FROM jobs WHERE coalesce(" \
+                        "finished_at, max(updated_at, " \
+                        "coalesce(heartbeat_at, 0))) < ?"
+                self._db.execute(
+                    f"DELETE FROM job_items WHERE job_id IN ({stale})",
+                    (cutoff,)
+                )
+                self._db.execute(f"DELETE FROM jobs WHERE job_id IN "
+                                 f"({stale})", (cutoff,))
+
+
+def get_store():
+    """Returns the process-wide job store at JOBS_PATH."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JobStore()
+    return _store
+
+
+class Job:
+    """A unit of background work with per-item progress.
+
+    items maps an item key (e.g. an assignment id) to a human readable
+    label. The job's run function reports each item through set_item().
+    """
+
+    def __init__(self, kind, owner, items, run, fingerprint=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.fingerprint = fingerprint
+        self.run = run
+        self.state = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.items = {
+            key: {'label': label, 'status': QUEUED, 'message': None}
+            for key, label in items.items()
+        }
+        self._lock = threading.Lock()
+        # Set once submitted; progress is then written through to it.
+        self._store = None
+
+    def set_item(self, key, status, message=None):
+        """Records the outcome of one item."""
+        with self._lock:
+            item = self.items.setdefault(
+                key, {'label': key, 'status': QUEUED, 'message': None}
+            )
+            item['status'] = status
+            item['message'] = message
+            item = dict(item)
+        if self._store is not None:
+            self._store.save_item(self.id, key, item)
+
+    def set_state(self, state, error=None):
+        """Records the job's state; DONE and FAILED finish it."""
+        self.state = state
+        self.error = error
+        if self.finished:
+            self.finished_at = time.time()
+        if self._store is not None:
+            self._store.save_state(self)
+
+    def counts(self):
+        """Returns the number of items in each status."""
+        with self._lock:
+            counts = {}
+            for item in self.items.values():
+                counts[item['status']] = counts.get(item['status'], 0) + 1
+            return counts
+
+    def to_dict(self):
+        """Returns a JSON-serialisable view of the job's progress."""
+        with self._lock:
+            items = [dict(item, key=key) for key, item in self.items.items()]
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'total': len(items),
+            'counts': self.counts(),
+            'items': items
+        }
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+
+def make_fingerprint(*parts):
+    """Returns a stable hash of a job's parameters, used to spot resubmits."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _worker_loop():
+    while True:
+        job = _job_queue.get()
+        try:
+            job.set_state(RUNNING)
+            job.run(job)
+            job.set_state(DONE)
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            for key, item in list(job.items.items()):
+                if item['status'] in (QUEUED, RUNNING):
+                    job.set_item(key, FAILED, str(e))
+            job.set_state(FAILED, str(e))
+        finally:
+            _job_queue.task_done()
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            get_store().beat(_holder)
+        except Exception as e:
+            print(f"Error recording job heartbeat: {e}")
+
+
+def _ensure_workers():
+    global _heartbeat_thread
+    with _workers_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(
+                target=_heartbeat_loop, name='job-heartbeat', daemon=True
+            )
+            _heartbeat_thread.start()
+        while len(_workers) < JOB_WORKERS:
+            worker = threading.Thread(
+                target=_worker_loop,
+                name=f'job-worker-{len(_workers)}',
+                daemon=True
+            )
+            worker.start()
+            _workers.append(worker)
+
+
+def submit_job(kind, owner, items, run, fingerprint=None):
+    """Queues run(job) on a worker thread and returns the Job.
+
+    If an unfinished job from the same owner has the same fingerprint, that
+    job is returned instead (possibly as run by another process), so a
+    double-submitted form is applied once.
+    """
+    store = get_store()
+    store.prune(time.time() - FINISHED_JOB_RETENTION_SECONDS)
+    job = Job(kind, owner, items, run, fingerprint)
+    existing_id = store.insert(job)
+    if existing_id is not None:
+        return store.load(existing_id, owner)
+    job._store = store
+    _ensure_workers()
+    _job_queue.put(job)
+    return job
+
+
+def get_job(job_id, owner):
+    """Returns the job with job_id if it belongs to owner, else None.
+
+    The job is read from the store, so it may be running in another
+    process; the returned Job is a snapshot of its progress.
+    """
+    return get_store().load(job_id, owner)
@@ -0,0 +1,218 @@
+"""Durable checkpoint journal for resumable bulk runs.
+
+Bulk imports and edits write to Classroom item by item. If a run dies
+partway (a crash, an expired token, exhausted quota), the journal records
+which items already succeeded, and the coursework id each one created, so
+running the same job again resumes with the items still pending instead of
+duplicating work. Runs are identified by a fingerprint of their inputs
+(see jobs.make_fingerprint); the journal is a SQLite file shared by the
+command-line scripts and the web app.
+
+An item is marked done only after Classroom confirmed the write, so an
+item that was in flight when the process died is sent again on resume.
+Failed items are retried too; skipped items (e.g. bulk edits of coursework
+changed in Classroom meanwhile) are not, so they do not hold a run open.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+JOURNAL_PATH = os.environ.get('CLASSROOM_JOURNAL_PATH', 'checkpoints.db')
+# Runs untouched for this long are deleted, finished or not.
+JOURNAL_RETENTION_SECONDS = int(os.environ.get('JOURNAL_RETENTION_SECONDS',
+                                               str(30 * 24 * 3600)))
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+# Status of a finished run some of whose items were skipped.
+PARTIAL = 'partial'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_fingerprint
+    ON runs (kind, course_id, fingerprint, finished_at);
+CREATE TABLE IF NOT EXISTS items (
+    run_id TEXT NOT NULL REFERENCES runs (run_id),
+    item_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result_id TEXT,
+    message TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, item_key)
+);
+"""
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+class Journal:
+    """A SQLite checkpoint store, safe to share between threads."""
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        # WAL keeps per-item commits cheap and readers unblocked.
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in
+                   self._db.execute('PRAGMA table_info(runs)').fetchall()}
+        if 'status' not in columns:
+            self._db.execute("ALTER TABLE runs ADD COLUMN status TEXT")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _execute_many(self, sql, rows):
+        with self._lock:
+            with self._db:
+                self._db.execute('BEGIN')
+                self._db.executemany(sql, rows)
+
+    def open_run(self, kind, course_id, fingerprint, item_keys=()):
+        """Returns the unfinished run with this fingerprint, or a new one.
+
+        item_keys is the run's plan; more items can be added later with
+        Run.add_items(). Items of a resumed run keep their recorded status.
+        Runs older than JOURNAL_RETENTION_SECONDS are pruned first.
+        """
+        self.prune(time.time() - JOURNAL_RETENTION_SECONDS)
+        rows = self._execute(
+            "SELECT run_id FROM runs WHERE kind = ? AND course_id = ? AND "
+            "fingerprint = ? AND finished_at IS NULL "
+            "ORDER BY created_at DESC LIMIT 1",
+            (kind, course_id, fingerprint)
+        )
+        if rows:
+            run = Run(self, rows[0][0], resumed=True)
+        else:
+            run = Run(self, uuid.uuid4().hex, resumed=False)
+            self._execute(
+                "INSERT INTO runs (run_id, kind, course_id, fingerprint, "
+                "created_at) VALUES (?, ?, ?, ?, ?)",
+                (run.run_id, kind, course_id, fingerprint, time.time())
+            )
+        run.add_items(item_keys)
+        return run
+
+    def prune(self, cutoff):
+        """Deletes runs finished, or last written to, before cutoff."""
+        stale = (
+            "SELECT run_id FROM runs WHERE coalesce(finished_at, max("
+            "created_at, coalesce((SELECT max(updated_at) FROM items "
+            "WHERE items.run_id = runs.run_id), 0))) < ?"
+        )
+        with self._lock:
+            with self._db:
+                self._db.execute('BEGIN')
+                self._db.execute(
+                    f"DELETE FROM items WHERE run_id IN ({stale})", (cutoff,)
+                )
+                self._db.execute(
+                    f"DELETE FROM runs WHERE run_id IN ({stale})", (cutoff,)
+                )
+
+
+class Run:
+    """One journaled run; item keys are strings chosen by the caller."""
+
+    def __init__(self, journal, run_id, resumed):
+        self.journal = journal
+        self.run_id = run_id
+        self.resumed = resumed
+
+    def add_items(self, item_keys):
+        """Adds items to the plan as pending; known items are unchanged."""
+        now = time.time()
+        self.journal._execute_many(
+            "INSERT OR IGNORE INTO items (run_id, item_key, status, "
+            "updated_at) VALUES (?, ?, ?, ?)",
+            [(self.run_id, str(key), PENDING, now) for key in item_keys]
+        )
+
+    def completed(self):
+        """Returns a dict of done item keys to their recorded result ids."""
+        return dict(self.journal._execute(
+            "SELECT item_key, result_id FROM items "
+            "WHERE run_id = ? AND status = ?",
+            (self.run_id, DONE)
+        ))
+
+    def skipped(self):
+        """Returns a dict of skipped item keys to their messages."""
+        return dict(self.journal._execute(
+            "SELECT item_key, message FROM items "
+            "WHERE run_id = ? AND status = ?",
+            (self.run_id, SKIPPED)
+        ))
+
+    def mark_done(self, item_key, result_id=None):
+        """Records that an item's write succeeded."""
+        self.journal._execute(
+            "UPDATE items SET status = ?, result_id = ?, message = NULL, "
+            "updated_at = ? WHERE run_id = ? AND item_key = ?",
+            (DONE, result_id, time.time(), self.run_id, str(item_key))
+        )
+
+    def mark_failed(self, item_key, message):
+        """Records that an item failed; it is retried when resumed."""
+        self.journal._execute(
+            "UPDATE items SET status = ?, message = ?, updated_at = ? "
+            "WHERE run_id = ? AND item_key = ?",
+            (FAILED, str(message), time.time(), self.run_id, str(item_key))
+        )
+
+    def mark_skipped(self, item_key, message):
+        """Records that an item will not be written; it is not retried."""
+        self.journal._execute(
+            "UPDATE items SET status = ?, message = ?, updated_at = ? "
+            "WHERE run_id = ? AND item_key = ?",
+            (SKIPPED, str(message), time.time(), self.run_id, str(item_key))
+        )
+
+    def finish(self):
+        """Closes the run unless items are left to retry; returns if it did.
+
+        Runs with failed or pending items stay open, so running the same
+        job again picks them up. A run closed with skipped items is
+        recorded as PARTIAL, otherwise as DONE.
+        """
+        counts = dict(self.journal._execute(
+            "SELECT status, COUNT(*) FROM items WHERE run_id = ? "
+            "GROUP BY status",
+            (self.run_id,)
+        ))
+        if counts.get(PENDING) or counts.get(FAILED):
+            return False
+        self.journal._execute(
+            "UPDATE runs SET finished_at = ?, status = ? WHERE run_id = ?",
+            (time.time(), PARTIAL if counts.get(SKIPPED) else DONE,
+             self.run_id)
+        )
+        return True
+
+
+def get_journal():
+    """Returns the process-wide journal at JOURNAL_PATH."""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = Journal()
+    return _journal
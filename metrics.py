@@ -0,0 +1,144 @@
+"""Minimal Prometheus-style metrics for the Classroom tools.
+
+Keeps counters and latency histograms in memory and renders them in the
+Prometheus text exposition format for the /metrics endpoint in app.py.
+Metrics are per process; with several gunicorn workers each worker reports
+its own series.
+"""
+import threading
+
+# Latency buckets in seconds, from fast cached calls to slow batch requests.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"'
+                          for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels."""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} "
+                f"{_format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """Counts observations into cumulative buckets, like Prometheus does."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # label values -> [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[position] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, list(series))
+                            for key, series in self._values.items())
+        lines = []
+        for key, series in values:
+            for position, bound in enumerate(self.buckets):
+                labels = _format_labels(self.labelnames, key,
+                                        [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {series[position]}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+def render():
+    """Returns every registered metric in the Prometheus text format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+CLASSROOM_REQUEST_SECONDS = Histogram(
+    'classroom_api_request_duration_seconds',
+    'Latency of each Classroom API HTTP attempt.',
+    ('method', 'status')
+)
+CLASSROOM_RETRIES = Counter(
+    'classroom_api_retries_total',
+    'Classroom API calls retried after a transient error.',
+    ('method',)
+)
+CLASSROOM_PAGES = Counter(
+    'classroom_api_list_pages_total',
+    'Pages fetched by Classroom list calls.',
+    ('method',)
+)
+CLASSROOM_BATCH_ITEMS = Counter(
+    'classroom_api_batch_items_total',
+    'Sub-requests sent through the Classroom batch endpoint, by outcome.',
+    ('method', 'status')
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'app_http_request_duration_seconds',
+    'Time spent handling each Flask route.',
+    ('endpoint', 'method', 'status')
+)
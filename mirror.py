@@ -0,0 +1,684 @@
+"""Local SQLite mirror of the user's courses, topics and coursework.
+
+The web app's pages only read from Classroom, and most of what they show
+changes rarely, so they are served from this mirror instead of the API. A
+background sync thread keeps the mirror fresh: every
+MIRROR_SYNC_INTERVAL_SECONDS it lists the user's courses (one call) and
+re-lists the topics and coursework of a course only when the course's
+updateTime changed or its copy is older than MIRROR_RESYNC_SECONDS
+(Classroom does not bump a course's updateTime when its coursework
+changes). Re-listed items are only written when their updateTime is newer
+than the mirrored one. Writes made through google_classroom_service are
+applied to the mirror as they happen, so the user sees their own changes
+immediately; live Classroom calls are left for writes and explicit
+refreshes. Users stop being synced after MIRROR_IDLE_SECONDS without a
+page view, and a lease row per user (sync_leases) makes one worker
+process sync them while the others only read.
+
+The mirror also keeps a search index over every mirrored coursework item
+(search_items, plus an FTS5 table over titles, topic and course names), so
+questions like "which courses still have Session 9 without the [BD]
+prefix" are answered by one local query instead of opening every course.
+
+Rows are keyed by a hash of the user's credentials key, so users sharing
+a server never see each other's courses.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+import fanout
+import google_classroom_service as gcs
+
+MIRROR_PATH = os.environ.get('CLASSROOM_MIRROR_PATH', 'mirror.db')
+MIRROR_SYNC_INTERVAL_SECONDS = int(
+    os.environ.get('MIRROR_SYNC_INTERVAL_SECONDS', '300')
+)
+MIRROR_RESYNC_SECONDS = int(os.environ.get('MIRROR_RESYNC_SECONDS', '900'))
+# Users without a page view for this long are no longer synced.
+MIRROR_IDLE_SECONDS = int(os.environ.get('MIRROR_IDLE_SECONDS', '3600'))
+# A process syncing a user holds a lease on them for this long, renewed
+# every round, so other worker processes leave that user alone.
+MIRROR_SYNC_LEASE_SECONDS = 2 * MIRROR_SYNC_INTERVAL_SECONDS + 60
+# Coursework fields kept in the mirror.
+MIRROR_FIELDS = gcs.COURSE_WORK_FIELD_PROFILES['mirror'].split(',')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    owner TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    position INTEGER,
+    update_time TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (owner, course_id)
+);
+CREATE TABLE IF NOT EXISTS topics (
+    owner TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    topic_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (owner, course_id, topic_id)
+);
+CREATE TABLE IF NOT EXISTS coursework (
+    owner TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    coursework_id TEXT NOT NULL,
+    position INTEGER,
+    update_time TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (owner, course_id, coursework_id)
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    owner TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    course_update_time TEXT,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (owner, course_id)
+);
+CREATE TABLE IF NOT EXISTS sync_leases (
+    owner TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS search_items (
+    id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    coursework_id TEXT NOT NULL,
+    course_name TEXT,
+    title TEXT,
+    topic TEXT,
+    state TEXT,
+    work_type TEXT,
+    due_date TEXT,
+    max_points REAL,
+    UNIQUE (owner, course_id, coursework_id)
+);
+CREATE INDEX IF NOT EXISTS search_items_order
+    ON search_items (owner, course_name, due_date, title);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_text USING fts5(
+    title, topic, course_name, content='search_items', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS search_items_insert
+AFTER INSERT ON search_items BEGIN
+    INSERT INTO search_text (rowid, title, topic, course_name)
+    VALUES (new.id, new.title, new.topic, new.course_name);
+END;
+CREATE TRIGGER IF NOT EXISTS search_items_delete
+AFTER DELETE ON search_items BEGIN
+    INSERT INTO search_text (search_text, rowid, title, topic, course_name)
+    VALUES ('delete', old.id, old.title, old.topic, old.course_name);
+END;
+CREATE TRIGGER IF NOT EXISTS search_items_update
+AFTER UPDATE ON search_items BEGIN
+    INSERT INTO search_text (search_text, rowid, title, topic, course_name)
+    VALUES ('delete', old.id, old.title, old.topic, old.course_name);
+    INSERT INTO search_text (rowid, title, topic, course_name)
+    VALUES (new.id, new.title, new.topic, new.course_name);
+END;
+"""
+# Bumped whenever search_items must be rebuilt from the mirrored coursework.
+SEARCH_INDEX_VERSION = 1
+# Indexes a course's mirrored coursework (or, with an extra
+# "AND w.coursework_id = ?", one item of it).
+_INDEX_COURSE_WORK = """
+INSERT INTO search_items (owner, course_id, coursework_id, course_name,
+                          title, topic, state, work_type, due_date,
+                          max_points)
+SELECT w.owner, w.course_id, w.coursework_id, json_extract(c.data, '$.name'),
+       json_extract(w.data, '$.title'), t.name,
+       json_extract(w.data, '$.state'), json_extract(w.data, '$.workType'),
+       CASE WHEN json_extract(w.data, '$.dueDate.year') IS NOT NULL
+            THEN printf('%04d-%02d-%02d',
+                        json_extract(w.data, '$.dueDate.year'),
+                        json_extract(w.data, '$.dueDate.month'),
+                        json_extract(w.data, '$.dueDate.day'))
+       END,
+       json_extract(w.data, '$.maxPoints')
+FROM coursework w
+LEFT JOIN courses c ON c.owner = w.owner AND c.course_id = w.course_id
+LEFT JOIN topics t ON t.owner = w.owner AND t.course_id = w.course_id
+    AND t.topic_id = json_extract(w.data, '$.topicId')
+WHERE w.owner = ? AND w.course_id = ?
+"""
+# Columns of a search result.
+SEARCH_COLUMNS = ('course_id', 'coursework_id', 'course_name', 'title',
+                  'topic', 'state', 'work_type', 'due_date', 'max_points')
+# syncs row recording when the course list itself was last synced.
+COURSE_LIST = ''
+
+_mirror = None
+_mirror_lock = threading.Lock()
+# owner -> {'creds', 'seen'} of the users synced by the background thread
+_sync_users = {}
+_sync_users_lock = threading.Lock()
+_sync_wakeup = threading.Event()
+_sync_thread = None
+# Identifies this process in sync_leases.
+_lease_holder = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+
+def owner_key(user_key):
+    """Returns the mirror owner for a gcs user key."""
+    return hashlib.sha256(repr(user_key).encode('utf-8')).hexdigest()
+
+
+def current_owner():
+    """Returns the mirror owner of the current user, or None."""
+    user_key = gcs.current_user_key()
+    return owner_key(user_key) if user_key is not None else None
+
+
+def _mirrored(item):
+    """Returns the part of a coursework item the mirror keeps."""
+    return {field: item[field] for field in MIRROR_FIELDS if field in item}
+
+
+def match_expression(text):
+    """Turns search box text into an FTS5 query matching every term.
+
+    Double-quoted parts are matched as phrases. Every term is quoted, so
+    FTS5 operators and punctuation in the text are taken literally.
+    Returns None when the text has nothing to match.
+    """
+    terms = [phrase or word
+             for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text or '')]
+    return ' '.join('"' + term.replace('"', '""') + '"'
+                    for term in terms if re.search(r'\w', term)) or None
+
+
+def _escape_like(text):
+    return re.sub(r'([\\%_])', r'\\\1', text)
+
+
+class Mirror:
+    """The SQLite mirror, safe to share between threads."""
+
+    def __init__(self, path=MIRROR_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        (version,), = self._db.execute('PRAGMA user_version').fetchall()
+        if version < SEARCH_INDEX_VERSION:
+            self._rebuild_search_index()
+
+    def _rebuild_search_index(self):
+        """Re-indexes every mirrored course (e.g. after an upgrade)."""
+        courses = self._execute(
+            "SELECT DISTINCT owner, course_id FROM coursework"
+        )
+        self._transaction([
+            ("DELETE FROM search_items", ()),
+            (_INDEX_COURSE_WORK, courses),
+            (f"PRAGMA user_version = {SEARCH_INDEX_VERSION}", ()),
+        ])
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _transaction(self, statements):
+        """Runs (sql, params or rows) pairs in one transaction."""
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                for sql, params in statements:
+                    if isinstance(params, list):
+                        self._db.executemany(sql, params)
+                    else:
+                        self._db.execute(sql, params)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def _synced_at(self, owner, course_id):
+        rows = self._execute(
+            "SELECT synced_at FROM syncs WHERE owner = ? AND course_id = ?",
+            (owner, course_id)
+        )
+        return rows[0][0] if rows else None
+
+    def courses(self, owner):
+        """Returns the user's courses, or None if never synced."""
+        if self._synced_at(owner, COURSE_LIST) is None:
+            return None
+        return [json.loads(data) for (data,) in self._execute(
+            "SELECT data FROM courses WHERE owner = ? ORDER BY position",
+            (owner,)
+        )]
+
+    def course(self, owner, course_id):
+        """Returns a mirrored course, or None."""
+        rows = self._execute(
+            "SELECT data FROM courses WHERE owner = ? AND course_id = ?",
+            (owner, course_id)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def course_work(self, owner, course_id):
+        """Returns a course's coursework, or None if never synced.
+
+        Items are in Classroom's listing order, with items created since the
+        last sync first.
+        """
+        if self._synced_at(owner, course_id) is None:
+            return None
+        return [json.loads(data) for (data,) in self._execute(
+            "SELECT data FROM coursework WHERE owner = ? AND course_id = ? "
+            "ORDER BY position IS NOT NULL, position",
+            (owner, course_id)
+        )]
+
+    def course_work_item(self, owner, course_id, coursework_id):
+        """Returns one mirrored coursework item, or None."""
+        rows = self._execute(
+            "SELECT data FROM coursework WHERE owner = ? AND course_id = ? "
+            "AND coursework_id = ?",
+            (owner, course_id, coursework_id)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def topics(self, owner, course_id):
+        """Returns a course's topic id -> name dict, or None if not synced."""
+        if self._synced_at(owner, course_id) is None:
+            return None
+        return dict(self._execute(
+            "SELECT topic_id, name FROM topics WHERE owner = ? AND "
+            "course_id = ?",
+            (owner, course_id)
+        ))
+
+    def store_courses(self, owner, courses):
+        """Replaces the user's course list; returns the previous versions.
+
+        Courses no longer listed are dropped with their topics and
+        coursework. Returns a dict of course id -> the updateTime recorded
+        by the course's last coursework sync, and when that sync ran.
+        """
+        previous = {course_id: (update_time, synced_at)
+                    for course_id, update_time, synced_at in self._execute(
+                        "SELECT course_id, course_update_time, synced_at "
+                        "FROM syncs WHERE owner = ? AND course_id != ?",
+                        (owner, COURSE_LIST)
+                    )}
+        listed = {course['id'] for course in courses}
+        gone = [(owner, course_id) for course_id in previous
+                if course_id not in listed]
+        statements = [
+            ("DELETE FROM courses WHERE owner = ?", (owner,)),
+            ("INSERT INTO courses (owner, course_id, position, update_time, "
+             "data) VALUES (?, ?, ?, ?, ?)",
+             [(owner, course['id'], position, course.get('updateTime'),
+               json.dumps(course))
+              for position, course in enumerate(courses)]),
+            ("INSERT OR REPLACE INTO syncs (owner, course_id, synced_at) "
+             "VALUES (?, ?, ?)", (owner, COURSE_LIST, time.time())),
+            ("UPDATE search_items SET course_name = ? WHERE owner = ? AND "
+             "course_id = ? AND course_name IS NOT ?",
+             [(course.get('name'), owner, course['id'], course.get('name'))
+              for course in courses]),
+        ]
+        for table in ('topics', 'coursework', 'syncs', 'search_items'):
+            statements.append(
+                (f"DELETE FROM {table} WHERE owner = ? AND course_id = ?",
+                 gone)
+            )
+        self._transaction(statements)
+        return previous
+
+    def store_course(self, owner, course_id, course_update_time, items,
+                     topics):
+        """Replaces a course's topics and coursework with a fresh listing.
+
+        Only items with a newer updateTime are rewritten. Returns the
+        number of coursework items added or changed and removed.
+        """
+        known = dict(self._execute(
+            "SELECT coursework_id, update_time FROM coursework "
+            "WHERE owner = ? AND course_id = ?",
+            (owner, course_id)
+        ))
+        known_topics = dict(self._execute(
+            "SELECT topic_id, name FROM topics WHERE owner = ? AND "
+            "course_id = ?",
+            (owner, course_id)
+        ))
+        listed = {item['id'] for item in items}
+
+        def is_newer(item):
+            # A write applied while the course was being listed is newer
+            # than the listed copy and must not be overwritten by it.
+            return item['id'] not in known or \
+                (item.get('updateTime') or '') > (known[item['id']] or '')
+
+        changed = [
+            (owner, course_id, item['id'], position, item.get('updateTime'),
+             json.dumps(_mirrored(item)))
+            for position, item in enumerate(items) if is_newer(item)
+        ]
+        # Positions move whenever something is added, so keep them current
+        # for the unchanged items too.
+        moved = [(position, owner, course_id, item['id'])
+                 for position, item in enumerate(items)
+                 if not is_newer(item)]
+        removed = [(owner, course_id, coursework_id)
+                   for coursework_id in known if coursework_id not in listed]
+        # Only re-index the course when something the index shows changed.
+        reindex = []
+        if changed or removed or known_topics != {
+                topic['topicId']: topic['name'] for topic in topics}:
+            reindex = [
+                ("DELETE FROM search_items WHERE owner = ? AND "
+                 "course_id = ?", (owner, course_id)),
+                (_INDEX_COURSE_WORK, (owner, course_id)),
+            ]
+        self._transaction([
+            ("INSERT OR REPLACE INTO coursework (owner, course_id, "
+             "coursework_id, position, update_time, data) "
+             "VALUES (?, ?, ?, ?, ?, ?)", changed),
+            ("UPDATE coursework SET position = ? WHERE owner = ? AND "
+             "course_id = ? AND coursework_id = ?", moved),
+            ("DELETE FROM coursework WHERE owner = ? AND course_id = ? AND "
+             "coursework_id = ?", removed),
+            ("DELETE FROM topics WHERE owner = ? AND course_id = ?",
+             (owner, course_id)),
+            ("INSERT OR REPLACE INTO topics (owner, course_id, topic_id, "
+             "name) VALUES (?, ?, ?, ?)",
+             [(owner, course_id, topic['topicId'], topic['name'])
+              for topic in topics]),
+            ("INSERT OR REPLACE INTO syncs (owner, course_id, "
+             "course_update_time, synced_at) VALUES (?, ?, ?, ?)",
+             (owner, course_id, course_update_time, time.time())),
+        ] + reindex)
+        return {'changed': len(changed), 'removed': len(removed)}
+
+    def store_course_work_item(self, owner, course_id, item, profile='full'):
+        """Applies one written or re-read coursework item to the mirror.
+
+        Fields outside the item's profile keep their mirrored values.
+        Courses that were never synced are left alone.
+        """
+        if self._synced_at(owner, course_id) is None:
+            return
+        fields = gcs.COURSE_WORK_FIELD_PROFILES.get(profile)
+        fields = fields.split(',') if fields else MIRROR_FIELDS
+        key = (owner, course_id, item['id'])
+        # The lock is reentrant: the read and the rewrite stay atomic.
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM coursework WHERE owner = ? AND "
+                "course_id = ? AND coursework_id = ?", key
+            ).fetchall()
+            data = json.loads(rows[0][0]) if rows else {}
+            data = {field: value for field, value in data.items()
+                    if field not in fields}
+            data.update(_mirrored(item))
+            self._transaction([
+                ("INSERT INTO coursework (owner, course_id, coursework_id, "
+                 "update_time, data) VALUES (?, ?, ?, ?, ?) "
+                 "ON CONFLICT (owner, course_id, coursework_id) DO UPDATE "
+                 "SET update_time = excluded.update_time, "
+                 "data = excluded.data",
+                 key + (item.get('updateTime'), json.dumps(data))),
+                ("DELETE FROM search_items WHERE owner = ? AND "
+                 "course_id = ? AND coursework_id = ?", key),
+                (_INDEX_COURSE_WORK + " AND w.coursework_id = ?", key),
+            ])
+
+    def acquire_sync_lease(self, owner, holder, seconds):
+        """Takes or renews the lease on syncing owner; returns success.
+
+        Fails while another holder's lease has not expired.
+        """
+        now = time.time()
+        self._execute(
+            "INSERT INTO sync_leases (owner, holder, expires_at) "
+            "VALUES (?, ?, ?) ON CONFLICT (owner) DO UPDATE "
+            "SET holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE sync_leases.holder = excluded.holder OR "
+            "sync_leases.expires_at < ?",
+            (owner, holder, now + seconds, now)
+        )
+        rows = self._execute(
+            "SELECT holder FROM sync_leases WHERE owner = ?", (owner,)
+        )
+        return bool(rows) and rows[0][0] == holder
+
+    def release_sync_lease(self, owner, holder):
+        """Gives up holder's lease on syncing owner, if it has one."""
+        self._execute(
+            "DELETE FROM sync_leases WHERE owner = ? AND holder = ?",
+            (owner, holder)
+        )
+
+    def search(self, owner, text=None, course=None, states=None,
+               due_from=None, due_to=None, min_points=None, max_points=None,
+               prefix=None, without_prefix=None, limit=200):
+        """Returns the user's mirrored coursework matching every filter.
+
+        text is matched against titles, topic and course names (see
+        match_expression), course is a case-insensitive shell-style course
+        name pattern ('Biology*'), due dates are 'YYYY-MM-DD' strings, and
+        prefix/without_prefix test the start of the title, ignoring case.
+        Returns up to limit dicts of SEARCH_COLUMNS, ordered by course
+        name, due date (undated first) and title.
+        """
+        sql = "SELECT " + ', '.join('i.' + column
+                                    for column in SEARCH_COLUMNS)
+        conditions, params = ["i.owner = ?"], [owner]
+        match = match_expression(text)
+        if match:
+            # CROSS JOIN makes SQLite start from the (few) FTS matches
+            # rather than probe the FTS table for every row in order.
+            sql += (" FROM search_text CROSS JOIN search_items i "
+                    "ON i.id = search_text.rowid")
+            conditions.append("search_text MATCH ?")
+            params.append(match)
+        else:
+            sql += " FROM search_items i"
+        if course:
+            conditions.append("lower(i.course_name) GLOB ?")
+            params.append(course.lower())
+        if states:
+            conditions.append(
+                f"i.state IN ({', '.join('?' * len(states))})"
+            )
+            params.extend(states)
+        for condition, value in (("i.due_date >= ?", due_from),
+                                 ("i.due_date <= ?", due_to),
+                                 ("i.max_points >= ?", min_points),
+                                 ("i.max_points <= ?", max_points)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        if prefix:
+            conditions.append("i.title LIKE ? ESCAPE '\\'")
+            params.append(_escape_like(prefix) + '%')
+        if without_prefix:
+            conditions.append("coalesce(i.title, '') NOT LIKE ? ESCAPE '\\'")
+            params.append(_escape_like(without_prefix) + '%')
+        sql += (" WHERE " + ' AND '.join(conditions) +
+                " ORDER BY i.course_name, i.due_date, i.title LIMIT ?")
+        params.append(limit)
+        return [dict(zip(SEARCH_COLUMNS, row))
+                for row in self._execute(sql, params)]
+
+
+def get_mirror():
+    """Returns the process-wide mirror at MIRROR_PATH."""
+    global _mirror
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                _mirror = Mirror()
+    return _mirror
+
+
+def get_courses():
+    """Returns the current user's mirrored courses, or None."""
+    return get_mirror().courses(current_owner())
+
+
+def get_course_name(course_id):
+    """Returns a mirrored course's name, or None."""
+    course = get_mirror().course(current_owner(), course_id)
+    return course.get('name') if course else None
+
+
+def get_course_work(course_id):
+    """Returns a course's mirrored coursework, or None if not synced."""
+    return get_mirror().course_work(current_owner(), course_id)
+
+
+def get_course_work_item(course_id, coursework_id):
+    """Returns one mirrored coursework item, or None."""
+    return get_mirror().course_work_item(current_owner(), course_id,
+                                         coursework_id)
+
+
+def get_topics(course_id):
+    """Returns a course's mirrored topic id -> name dict, or None."""
+    return get_mirror().topics(current_owner(), course_id)
+
+
+def search(**filters):
+    """Searches the current user's mirrored coursework (see Mirror.search)."""
+    return get_mirror().search(current_owner(), **filters)
+
+
+def store_course_listing(course_id, items, topics):
+    """Stores a live listing of a course (e.g. after an explicit refresh).
+
+    items are coursework items listed with the 'mirror' profile and topics
+    maps topic ids to names.
+    """
+    owner = current_owner()
+    course = get_mirror().course(owner, course_id) or {}
+    get_mirror().store_course(
+        owner, course_id, course.get('updateTime'), items,
+        [{'topicId': topic_id, 'name': name}
+         for topic_id, name in topics.items()]
+    )
+
+
+def store_courses(courses):
+    """Stores a live listing of the current user's courses."""
+    get_mirror().store_courses(current_owner(), courses)
+
+
+def _on_course_work(user_key, course_id, item, profile):
+    if user_key is not None and item and item.get('id'):
+        get_mirror().store_course_work_item(owner_key(user_key), course_id,
+                                            item, profile)
+
+
+gcs.add_course_work_listener(_on_course_work)
+
+
+def sync_course(course_id, course_update_time=None):
+    """Re-lists one course's topics and coursework into the mirror.
+
+    Must run with credentials bound or in a request context. Returns the
+    counts from Mirror.store_course. API errors propagate.
+    """
+    items = list(gcs.iter_course_work(course_id, profile='mirror'))
+    topics = list(gcs.iter_topics(course_id))
+    return get_mirror().store_course(current_owner(), course_id,
+                                     course_update_time, items, topics)
+
+
+def sync(creds, force=False):
+    """Brings the user's part of the mirror up to date.
+
+    Lists the user's courses and re-lists the courses that changed, that
+    were never synced, or whose copy is older than MIRROR_RESYNC_SECONDS
+    (all of them with force=True), MAX_PARALLEL_COURSES at a time. Returns
+    the per-course outcomes of fanout.run_across_courses.
+    """
+    with gcs.bound_credentials(creds):
+        owner = current_owner()
+        courses = list(gcs.iter_courses())
+    previous = get_mirror().store_courses(owner, courses)
+    now = time.time()
+    stale = [
+        course for course in courses
+        if force or course['id'] not in previous or
+        previous[course['id']][0] != course.get('updateTime') or
+        now - previous[course['id']][1] > MIRROR_RESYNC_SECONDS
+    ]
+    if not stale:
+        return {}
+    update_times = {course['id']: course.get('updateTime')
+                    for course in stale}
+    return fanout.run_across_courses(
+        creds, stale,
+        lambda course_id: sync_course(course_id, update_times[course_id])
+    )
+
+
+def _sync_loop():
+    while True:
+        now = time.monotonic()
+        with _sync_users_lock:
+            idle = [owner for owner, user in _sync_users.items()
+                    if now - user['seen'] > MIRROR_IDLE_SECONDS]
+            for owner in idle:
+                del _sync_users[owner]
+            users = [(owner, user['creds'])
+                     for owner, user in _sync_users.items()]
+        for owner in idle:
+            get_mirror().release_sync_lease(owner, _lease_holder)
+        for owner, creds in users:
+            try:
+                # Only one process syncs a user; the others keep serving
+                # pages from what it writes.
+                if not get_mirror().acquire_sync_lease(
+                        owner, _lease_holder, MIRROR_SYNC_LEASE_SECONDS):
+                    continue
+                outcomes = sync(creds)
+                if outcomes:
+                    print(f"Mirror synced {len(outcomes)} course(s).")
+            except Exception as e:
+                print(f"Error syncing mirror: {e}")
+        _sync_wakeup.wait(MIRROR_SYNC_INTERVAL_SECONDS)
+        _sync_wakeup.clear()
+
+
+def ensure_syncing(creds):
+    """Keeps the mirror of the user behind creds synced in the background.
+
+    Starts the sync thread on first use; the user's first sync starts right
+    away. Called on every request: users without one for
+    MIRROR_IDLE_SECONDS stop being synced.
+    """
+    global _sync_thread
+    owner = owner_key(gcs._credentials_key(creds))
+    with _sync_users_lock:
+        user = _sync_users.get(owner)
+        if user is not None and user['creds'] is creds:
+            user['seen'] = time.monotonic()
+            return
+        _sync_users[owner] = {'creds': creds, 'seen': time.monotonic()}
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(target=_sync_loop, daemon=True,
+                                            name='classroom-mirror-sync')
+            _sync_thread.start()
+    _sync_wakeup.set()
+
+
+def stop_syncing(creds):
+    """Stops syncing the mirror for the user behind creds (e.g. on logout)."""
+    owner = owner_key(gcs._credentials_key(creds))
+    with _sync_users_lock:
+        _sync_users.pop(owner, None)
+    get_mirror().release_sync_lease(owner, _lease_holder)
@@ -1,14 +1,15 @@
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import google_classroom_service as gcs
 import pandas as pd
 import pickle
 import os
 import base64
 import sys
+import fanout
 
 # Configuration
-ENCODED_COURSE_ID = "NzA3ODgxMzE3NTE2"  # Your encoded course ID
+ENCODED_COURSE_IDS = ["NzA3ODgxMzE3NTE2"]  # Your encoded course IDs
 PREFIX = "[BD] "
 CSV_FILE = "bd_structure.csv"  # Your CSV file with assignments
 
@@ -70,11 +71,13 @@ def main():
         
         # Get credentials and create service
         creds = get_credentials()
-        service = build('classroom', 'v1', credentials=creds)
+        service = gcs.build_classroom_service(creds)
         
         # Verify course access
         try:
-            course = service.courses().get(id=TEST_COURSE_ID).execute()
+            course = gcs.execute_request(
+                service.courses().get(id=TEST_COURSE_ID)
+            )
             print(f"Found course: {course.get('name', 'Unknown')}")
         except Exception as e:
             print(f"Error accessing course: {str(e)}")
@@ -82,11 +85,9 @@ def main():
         
         # Get all coursework
         try:
-            coursework = service.courses().courseWork().list(
-                courseId=TEST_COURSE_ID,
-                courseWorkStates=['PUBLISHED', 'DRAFT']
-            ).execute()
-            assignments = coursework.get('courseWork', [])
+            with gcs.bound_credentials(creds):
+                assignments = list(gcs.iter_course_work(TEST_COURSE_ID,
+                                                        profile='summary'))
             print(f"\nFound {len(assignments)} assignments in classroom.")
         except Exception as e:
             print(f"Error listing assignments: {str(e)}")
@@ -116,12 +117,14 @@ def main():
             
             print(f"Attempting to rename: {TEST_ASSIGNMENT_TITLE} -> {new_title}")
             
-            service.courses().courseWork().patch(
-                courseId=TEST_COURSE_ID,
-                id=target_assignment['id'],
-                updateMask='title',
-                body=update
-            ).execute()
+            gcs.execute_request(
+                service.courses().courseWork().patch(
+                    courseId=TEST_COURSE_ID,
+                    id=target_assignment['id'],
+                    updateMask='title',
+                    body=update
+                )
+            )
             
             print(f"SUCCESS! Renamed: {TEST_ASSIGNMENT_TITLE} -> {new_title}")
             
@@ -131,12 +134,14 @@ def main():
                 'title': TEST_ASSIGNMENT_TITLE
             }
             
-            service.courses().courseWork().patch(
-                courseId=TEST_COURSE_ID,
-                id=target_assignment['id'],
-                updateMask='title',
-                body=update
-            ).execute()
+            gcs.execute_request(
+                service.courses().courseWork().patch(
+                    courseId=TEST_COURSE_ID,
+                    id=target_assignment['id'],
+                    updateMask='title',
+                    body=update
+                )
+            )
             
             print(f"Restored original name: {new_title} -> {TEST_ASSIGNMENT_TITLE}")
             
@@ -156,79 +161,102 @@ def main():
     for title in sorted(csv_titles):
         print(f"CSV: {title}")
     
-    # Decode course ID
-    course_id = decode_course_id(ENCODED_COURSE_ID)
-    print(f"\nUsing course ID: {course_id}")
+    # Course selectors on the command line (encoded course ids, 'all' or
+    # 'name:<pattern>') replace ENCODED_COURSE_IDS.
+    selector = fanout.parse_selector(sys.argv[1:] or ENCODED_COURSE_IDS)
+    if selector.get('course_ids'):
+        selector['course_ids'] = [decode_course_id(encoded_id)
+                                  for encoded_id in selector['course_ids']]
+    print(f"\nUsing courses: {selector or 'all'}")
     
-    # Get credentials and create service
+    # Get credentials and rename in every course
     creds = get_credentials()
-    service = build('classroom', 'v1', credentials=creds)
-    
+    with gcs.bound_credentials(creds):
+        courses = fanout.select_courses(**selector)
+    fanout.print_summary(rename_courses(creds, courses, csv_titles, PREFIX))
+    print(f"Classroom request stats: {gcs.get_request_stats()}")
+
+
+def plan_renames(assignments, csv_titles, prefix):
+    """Returns (assignment, new_title) pairs and the number of skipped items.
+
+    An assignment is renamed if its title is in csv_titles and does not
+    already start with prefix.
+    """
+    renames = []
+    skipped = 0
+    for assignment in assignments:
+        current_title = assignment.get('title', '')
+        if current_title.startswith(prefix):
+            print(f"Skipping (already has prefix): {current_title}")
+            skipped += 1
+        elif current_title not in csv_titles:
+            print(f"Skipping (not in CSV): {current_title}")
+            skipped += 1
+        else:
+            renames.append((assignment, f"{prefix}{current_title}"))
+    return renames, skipped
+
+
+def rename_course_assignments(course_id, csv_titles, prefix):
+    """Adds prefix to every assignment in the course whose title is listed.
+
+    Lists every page of the course's coursework, works out the renames up
+    front and sends them as batched patches. Must run with credentials
+    bound (see gcs.bound_credentials). Returns a summary dict with the
+    number of renamed, failed and skipped assignments. Raises RuntimeError
+    if the course or its coursework could not be read.
+    """
     # Verify course access
     try:
-        course = service.courses().get(id=course_id).execute()
+        course = gcs.execute_request(
+            gcs.get_classroom_service().courses().get(id=course_id)
+        )
         print(f"Found course: {course.get('name', 'Unknown')}")
     except Exception as e:
-        print(f"Error accessing course: {str(e)}")
-        return
+        raise RuntimeError(f"Could not access course {course_id}: {e}") from e
     
-    # Get all coursework
+    # Get all coursework, both published and draft, across every page
     try:
-        # Get both published and draft assignments
-        coursework = service.courses().courseWork().list(
-            courseId=course_id,
-            courseWorkStates=['PUBLISHED', 'DRAFT']
-        ).execute()
-        assignments = coursework.get('courseWork', [])
-        print(f"\nFound {len(assignments)} assignments in classroom:")
-        for assignment in assignments:
-            state = assignment.get('state', 'UNKNOWN')
-            print(f"Classroom: {assignment['title']} ({state})")
+        assignments = list(gcs.iter_course_work(course_id, profile='summary'))
+        print(f"\nFound {len(assignments)} assignments in course {course_id}.")
     except Exception as e:
-        print(f"Error listing assignments: {str(e)}")
-        return
-    
-    if not assignments:
-        print("No assignments found in the course.")
-        return
-    
-    print("\nStarting renaming process:")
-    # Update each assignment that matches CSV titles
-    for assignment in assignments:
-        current_title = assignment['title']
-        
-        # Skip if already has prefix
-        if current_title.startswith(PREFIX):
-            print(f"Skipping (already has prefix): {current_title}")
-            continue
-            
-        # Skip if not in CSV
-        if current_title not in csv_titles:
-            print(f"Skipping (not in CSV): {current_title}")
-            continue
-            
-        # Create new title
-        new_title = f"{PREFIX}{current_title}"
-        
-        # Update the assignment
-        try:
-            update = {
-                'title': new_title
-            }
-            
-            service.courses().courseWork().patch(
-                courseId=course_id,
-                id=assignment['id'],
-                updateMask='title',
-                body=update
-            ).execute()
-            
-            print(f"Renamed: {current_title} -> {new_title}")
-            
-        except Exception as e:
-            print(f"Error updating {current_title}: {str(e)}")
+        raise RuntimeError(
+            f"Could not list assignments for course {course_id}: {e}"
+        ) from e
+
+    renames, skipped = plan_renames(assignments, csv_titles, prefix)
+    print(f"\nRenaming {len(renames)} assignments in course {course_id}:")
+    results = gcs.batch_update_course_work(
+        course_id,
+        [(assignment['id'], {'title': new_title}, 'title')
+         for assignment, new_title in renames]
+    )
+
+    summary = {'renamed': 0, 'failed': 0, 'skipped': skipped}
+    for (assignment, new_title), (_, _, error) in zip(renames, results):
+        if error is not None:
+            print(f"Error updating {assignment['title']}: {str(error)}")
+            summary['failed'] += 1
+        else:
+            print(f"Renamed: {assignment['title']} -> {new_title}")
+            summary['renamed'] += 1
+    return summary
+
+
+def rename_courses(creds, courses, csv_titles, prefix):
+    """Runs rename_course_assignments for several courses in parallel.
+
+    courses are course dicts from fanout.select_courses. Returns the
+    per-course outcomes of fanout.run_across_courses.
+    """
+    return fanout.run_across_courses(
+        creds, courses,
+        lambda course_id: rename_course_assignments(course_id, csv_titles,
+                                                    prefix)
+    )
 
 
 if __name__ == '__main__':
     main()
-    print("\nDone! All matching assignments have been renamed.") 
\ No newline at end of file
+    print("\nDone! All matching assignments have been renamed.")
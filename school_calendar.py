@@ -0,0 +1,154 @@
+"""Course meeting calendars built from schedule_config.json.
+
+The schedule configuration page stores the school year and the weekdays
+each course meets. A CourseCalendar turns that into a NumPy business-day
+calendar whose "business days" are the course's meetings, with school
+holidays and per-course exclusions removed, and precomputes every meeting
+date of the year. Import CSVs can then give dates as sessions instead of
+typing them: resolve() maps a whole column of cells such as 'session 12',
+'S12 +2', 'next' or '11/5/2025 -1' to dates in one vectorized pass.
+
+The config may carry, besides what the page saves, a top-level "holidays"
+list and per-course "exclusions" lists of YYYY-MM-DD dates.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+import csv_validation
+
+DAYS_OF_WEEK = (
+    "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday",
+    "Sunday"
+)
+
+# A session number, 'next' or a date, optionally followed by an offset in
+# class meetings.
+SPEC_PATTERN = re.compile(
+    r'^(?:(?:session|s)\s*(?P<session>\d+)|(?P<next>next)|'
+    r'(?P<date>\d{1,4}[/-]\d{1,2}[/-]\d{1,4}))'
+    r'\s*(?:(?P<sign>[+-])\s*(?P<offset>\d+))?$',
+    re.IGNORECASE
+)
+
+
+def _days(values):
+    """Returns YYYY-MM-DD strings or dates as a datetime64[D] array."""
+    return np.array([str(value)[:10] for value in values or ()],
+                    dtype='datetime64[D]')
+
+
+def local_times(dates, at, timezone_str):
+    """Returns dates at the local time of day `at`, converted to UTC."""
+    local = dates + pd.Timedelta(hours=at.hour, minutes=at.minute)
+    return local.dt.tz_localize(
+        timezone_str, ambiguous=False, nonexistent='shift_forward'
+    ).dt.tz_convert('UTC')
+
+
+class CourseCalendar:
+    """The class meetings of one course during the school year."""
+
+    def __init__(self, start, end, days, holidays=(), exclusions=(),
+                 timezone_str='UTC'):
+        weekmask = [day in days for day in DAYS_OF_WEEK]
+        if not any(weekmask):
+            raise ValueError("A course calendar needs at least one day.")
+        self.start = np.datetime64(str(start)[:10], 'D')
+        self.end = np.datetime64(str(end)[:10], 'D')
+        if self.end < self.start:
+            raise ValueError("The school year ends before it starts.")
+        self.timezone_str = timezone_str
+        self.busdaycal = np.busdaycalendar(
+            weekmask=weekmask,
+            holidays=np.concatenate([_days(holidays), _days(exclusions)])
+        )
+        year = np.arange(self.start, self.end + 1, dtype='datetime64[D]')
+        self.meetings = year[np.is_busday(year, busdaycal=self.busdaycal)]
+
+    def session_dates(self, sessions):
+        """Returns the date of each 1-based session number; NaT if none."""
+        sessions = np.asarray(sessions, dtype=float)
+        valid = (sessions >= 1) & (sessions <= len(self.meetings))
+        dates = np.full(sessions.shape, np.datetime64('NaT'),
+                        dtype='datetime64[D]')
+        dates[valid] = self.meetings[sessions[valid].astype(int) - 1]
+        return dates
+
+    def offset_dates(self, dates, offsets):
+        """Returns the meeting `offsets` meetings away from each date.
+
+        Dates that are not meetings count from the next meeting, so an
+        offset of 0 rolls forward to it.
+        """
+        return np.busday_offset(np.asarray(dates, dtype='datetime64[D]'),
+                                offsets, roll='forward',
+                                busdaycal=self.busdaycal)
+
+    def next_meetings(self, dates):
+        """Returns the first meeting strictly after each date."""
+        return np.busday_offset(np.asarray(dates, dtype='datetime64[D]'), 1,
+                                roll='backward', busdaycal=self.busdaycal)
+
+    def today(self):
+        """Returns today's date in the calendar's timezone."""
+        return np.datetime64(
+            pd.Timestamp.now(tz=self.timezone_str).date(), 'D'
+        )
+
+    def resolve(self, values, today=None):
+        """Resolves a column of date cells to dates, like parse_dates.
+
+        A cell is 'session N' (or 'SN'), 'next' (the first meeting after
+        today), or a date in one of csv_validation.DATE_FORMATS, optionally
+        followed by '+K' or '-K' class meetings ('+0' rolls a day without
+        class forward to the next meeting). Plain dates are kept as
+        given; dates computed from the calendar that fall outside the
+        school year are NaT, like cells that cannot be parsed.
+        """
+        text = pd.Series(values).fillna('').astype(str).str.strip()
+        parts = text.str.extract(SPEC_PATTERN)
+        dates = csv_validation.parse_dates(parts['date'].fillna('')) \
+            .to_numpy(dtype='datetime64[D]', copy=True)
+
+        sessions = pd.to_numeric(parts['session'], errors='coerce')
+        has_session = sessions.notna().to_numpy()
+        dates[has_session] = self.session_dates(sessions[has_session])
+        has_next = parts['next'].notna().to_numpy()
+        if has_next.any():
+            dates[has_next] = self.next_meetings(
+                today if today is not None else self.today()
+            )
+
+        offsets = pd.to_numeric(parts['offset'], errors='coerce') \
+            .fillna(0).astype(int).to_numpy()
+        offsets = np.where(parts['sign'] == '-', -offsets, offsets)
+        shifted = parts['offset'].notna().to_numpy() & ~np.isnat(dates)
+        dates[shifted] = self.offset_dates(dates[shifted], offsets[shifted])
+
+        computed = has_session | has_next | shifted
+        outside = computed & ((dates < self.start) | (dates > self.end))
+        dates[outside] = np.datetime64('NaT')
+        return pd.Series(dates.astype('datetime64[ns]'), index=text.index)
+
+
+def schedule_calendar(config, schedule, timezone_str='UTC'):
+    """Returns the CourseCalendar for a course_schedules entry, or None."""
+    if not config.get('school_year_start') or \
+            not config.get('school_year_end') or \
+            not schedule or not schedule.get('days'):
+        return None
+    return CourseCalendar(
+        config['school_year_start'], config['school_year_end'],
+        schedule['days'], config.get('holidays', ()),
+        schedule.get('exclusions', ()), timezone_str
+    )
+
+
+def course_calendar(config, course_id, timezone_str='UTC'):
+    """Returns the CourseCalendar for course_id, or None if unscheduled."""
+    for schedule in config.get('course_schedules', []):
+        if schedule.get('course_id') == course_id:
+            return schedule_calendar(config, schedule, timezone_str)
+    return None
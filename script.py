@@ -0,0 +1,275 @@
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.transport.requests import Request
+import google_classroom_service as gcs
+import config_store
+import csv_validation
+import fanout
+import jobs
+import journal
+import school_calendar
+import csv
+import hashlib
+import itertools
+import os.path
+import pickle
+import sys
+from datetime import time
+import pandas as pd
+
+
+# Configuration Constants
+COURSE_ID = "YOUR_COURSE_ID"  # Your Google Classroom course ID
+TIMEZONE = "America/Los_Angeles"  # Your timezone
+CSV_FILE = "bd_structure.csv"  # Your CSV file name
+REPORT_FILE = "import_report.csv"  # Per-row outcomes are written here
+# Meeting days of scheduled courses, for dates given as sessions
+SCHEDULE_CONFIG_FILE = "schedule_config.json"
+
+# Scheduled assignments publish at 00:01 and are due at 23:59, local time.
+PUBLISH_TIME = time(0, 1)
+DUE_TIME = time(23, 59)
+REQUIRED_COLUMNS = ('Group', 'Title', 'DueDate', 'ScheduledDate', 'Points')
+
+# Row outcomes, besides csv_validation.SKIPPED and csv_validation.REJECTED
+CREATED = 'created'
+FAILED = 'failed'
+
+# Google Classroom API Scopes
+SCOPES = [
+    'https://www.googleapis.com/auth/classroom.courses',
+    'https://www.googleapis.com/auth/classroom.coursework.students',
+    'https://www.googleapis.com/auth/classroom.topics'
+]
+
+
+def get_credentials():
+    """Gets valid user credentials from storage."""
+    creds = None
+    if os.path.exists('token.pickle'):
+        with open('token.pickle', 'rb') as token:
+            creds = pickle.load(token)
+
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(
+                'credentials.json', SCOPES)
+            creds = flow.run_local_server(port=0)
+        with open('token.pickle', 'wb') as token:
+            pickle.dump(creds, token)
+
+    return creds
+
+
+def _file_digest(path):
+    """Returns a SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_rows(rows, timezone_str, now):
+    """Turns validated CSV rows into coursework bodies.
+
+    rows comes from csv_validation.prepare_rows. Dates are local to
+    timezone_str; Classroom expects the due date and time and the scheduled
+    publish time in UTC. Rows publishing after now are created as drafts
+    with a scheduledTime, the others are published right away. Returns the
+    remaining rows, a body for each of them, and a rejects frame for rows
+    scheduled to publish after they are due.
+    """
+    due = school_calendar.local_times(rows['DueDate'], DUE_TIME,
+                                      timezone_str)
+    publish = school_calendar.local_times(rows['ScheduledDate'],
+                                          PUBLISH_TIME, timezone_str)
+    late = publish > due
+    rejects = pd.DataFrame({
+        'line': rows['line'][late],
+        'title': rows['Title'][late],
+        'status': csv_validation.REJECTED,
+        'message': "ScheduledDate is after DueDate."
+    }, columns=csv_validation.REPORT_COLUMNS)
+    rows, due, publish = rows[~late], due[~late], publish[~late]
+    scheduled = publish > now
+    scheduled_times = publish.dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    bodies = []
+    for title, points, due_at, is_scheduled, scheduled_time in zip(
+            rows['Title'], rows['Points'], due, scheduled, scheduled_times):
+        body = {
+            'title': title,
+            'workType': 'ASSIGNMENT',
+            'state': 'DRAFT' if is_scheduled else 'PUBLISHED',
+            'maxPoints': int(points) if points.is_integer() else points,
+            'dueDate': {
+                'year': due_at.year,
+                'month': due_at.month,
+                'day': due_at.day,
+            },
+            'dueTime': {
+                'hours': due_at.hour,
+                'minutes': due_at.minute,
+            }
+        }
+        if is_scheduled:
+            body['scheduledTime'] = scheduled_time
+        bodies.append(body)
+    return rows, bodies, rejects
+
+
+def import_assignments(course_id, csv_file, timezone_str='UTC',
+                       report_file=None):
+    """Creates coursework for every valid row of csv_file.
+
+    The import is a pipeline: the file is read and validated in chunks
+    (see csv_validation), and valid rows are handed to the Classroom batch
+    endpoint MAX_BATCH_SIZE at a time, with the topics each batch needs
+    created (through the shared topic index) just before it is sent, so
+    later rows are still being read while earlier batches are in flight.
+    Progress is checkpointed in the journal: importing the same file into
+    the course again after an interruption skips the rows already created.
+    If the course has a schedule in SCHEDULE_CONFIG_FILE, dates can also be
+    given as class sessions (see school_calendar.CourseCalendar.resolve).
+    Must run with credentials bound (see gcs.bound_credentials). Returns a
+    list of per-row outcome dicts, which are also written to report_file.
+    """
+    now = pd.Timestamp.now(tz='UTC')
+    calendar = config_store.get_store(SCHEDULE_CONFIG_FILE).calendar(
+        course_id, timezone_str
+    )
+    resolve_dates = calendar.resolve if calendar else \
+        csv_validation.parse_dates
+    topics = dict(gcs.get_topic_index(course_id)['by_name'])
+    run = journal.get_journal().open_run(
+        'csv_import', course_id,
+        jobs.make_fingerprint(course_id, timezone_str, _file_digest(csv_file))
+    )
+    completed = run.completed()
+    if completed:
+        print(f"Resuming: {len(completed)} rows were imported by an earlier "
+              f"run.")
+    outcomes = []
+    # Outcome of each row sent to Classroom, by batch position.
+    submitted = []
+
+    def record_rejects(rejects):
+        for reject in rejects.to_dict('records'):
+            outcomes.append(dict(reject, id=''))
+
+    def validated_rows():
+        for rows, rejects in csv_validation.iter_prepared_rows(
+                csv_file, REQUIRED_COLUMNS,
+                optional_dates=('ScheduledDate',),
+                resolve_dates=resolve_dates):
+            record_rejects(rejects)
+            rows, bodies, late = normalize_rows(rows, timezone_str, now)
+            record_rejects(late)
+            run.add_items(rows['line'])
+            for line_number, title, group, body in zip(
+                    rows['line'], rows['Title'], rows['Group'], bodies):
+                outcome = {'line': line_number, 'title': title,
+                           'status': None, 'message': '', 'id': ''}
+                outcomes.append(outcome)
+                if str(line_number) in completed:
+                    outcome.update(status=CREATED,
+                                   id=completed[str(line_number)],
+                                   message="Created by an earlier run.")
+                    continue
+                yield outcome, group, body
+
+    def assignment_bodies():
+        rows = validated_rows()
+        while True:
+            chunk = list(itertools.islice(rows, gcs.MAX_BATCH_SIZE))
+            if not chunk:
+                return
+            missing = {group for _, group, _ in chunk
+                       if group and group not in topics}
+            if missing:
+                topics.update(gcs.ensure_topics(course_id, missing))
+            for outcome, group, body in chunk:
+                if group:
+                    if group not in topics:
+                        outcome.update(status=FAILED, message=(
+                            f"Topic '{group}' could not be created."
+                        ))
+                        run.mark_failed(outcome['line'], outcome['message'])
+                        continue
+                    body['topicId'] = topics[group]
+                submitted.append(outcome)
+                yield body
+
+    def record(position, created, error):
+        outcome = submitted[position]
+        if error is not None:
+            outcome.update(status=FAILED, message=str(error))
+            run.mark_failed(outcome['line'], error)
+        else:
+            outcome.update(status=CREATED, id=created.get('id', ''),
+                           message=created.get('state', ''))
+            run.mark_done(outcome['line'], created.get('id'))
+
+    gcs.batch_create_course_work(course_id, assignment_bodies(),
+                                 on_result=record)
+    run.finish()
+
+    outcomes.sort(key=lambda outcome: outcome['line'])
+    for outcome in outcomes:
+        print(f"Line {outcome['line']}: {outcome['status']} "
+              f"'{outcome['title']}' {outcome['message']}".rstrip())
+    counts = {}
+    for outcome in outcomes:
+        counts[outcome['status']] = counts.get(outcome['status'], 0) + 1
+    print(f"\nImport summary: {counts}")
+    print(f"Classroom request stats: {gcs.get_request_stats()}")
+
+    if report_file:
+        with open(report_file, 'w', newline='') as f:
+            writer = csv.DictWriter(
+                f, fieldnames=['line', 'title', 'status', 'message', 'id']
+            )
+            writer.writeheader()
+            writer.writerows(outcomes)
+        print(f"Per-row outcomes written to {report_file}")
+    return outcomes
+
+
+def _report_path(course_id, course_count):
+    """Returns REPORT_FILE, suffixed with the course id for multi-course runs."""
+    if course_count == 1:
+        return REPORT_FILE
+    root, extension = os.path.splitext(REPORT_FILE)
+    return f"{root}_{course_id}{extension}"
+
+
+def main():
+    # Course selectors on the command line (course ids, 'all' or
+    # 'name:<pattern>') replace COURSE_ID.
+    selector = fanout.parse_selector(sys.argv[1:] or [COURSE_ID])
+    print(f"\nUsing courses: {selector or 'all'}")
+    print(f"Using timezone: {TIMEZONE}")
+    print("Starting assignment import...\n")
+
+    creds = get_credentials()
+    with gcs.bound_credentials(creds):
+        courses = fanout.select_courses(**selector)
+
+    def import_course(course_id):
+        outcomes = import_assignments(
+            course_id, CSV_FILE, TIMEZONE,
+            _report_path(course_id, len(courses))
+        )
+        counts = {}
+        for outcome in outcomes:
+            counts[outcome['status']] = counts.get(outcome['status'], 0) + 1
+        return counts
+
+    fanout.print_summary(fanout.run_across_courses(creds, courses,
+                                                   import_course))
+
+
+if __name__ == '__main__':
+    main()
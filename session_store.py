@@ -0,0 +1,184 @@
+"""Server-side storage for the web app's OAuth credentials.
+
+The Flask session is a signed cookie, so credentials kept in it travel with
+every request and are unpickled again by every worker. Instead, the cookie
+only carries an opaque random session id and the credentials live here,
+keyed by a hash of that id, where every worker process can find them.
+
+Two backends are provided, chosen with SESSION_STORE_BACKEND: 'sqlite' (the
+default; one database file at SESSION_STORE_PATH) and 'filesystem' (one
+file per session in the SESSION_STORE_PATH directory). A session expires
+SESSION_LIFETIME_SECONDS after its credentials were last stored (at login
+and at every token refresh).
+"""
+import abc
+import hashlib
+import os
+import pickle
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+
+SESSION_STORE_BACKEND = os.environ.get('SESSION_STORE_BACKEND', 'sqlite')
+SESSION_STORE_PATH = os.environ.get(
+    'SESSION_STORE_PATH',
+    'sessions' if SESSION_STORE_BACKEND == 'filesystem' else 'sessions.db'
+)
+SESSION_LIFETIME_SECONDS = int(
+    os.environ.get('SESSION_LIFETIME_SECONDS', str(30 * 24 * 3600))
+)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def new_session_id():
+    """Returns a fresh, unguessable session id for the session cookie."""
+    return secrets.token_urlsafe(32)
+
+
+def _key(session_id):
+    """Returns the storage key for a session id; ids are never stored."""
+    return hashlib.sha256(session_id.encode('utf-8')).hexdigest()
+
+
+class SessionStore(abc.ABC):
+    """Maps session ids to credentials; subclasses provide the storage."""
+
+    def __init__(self, lifetime=SESSION_LIFETIME_SECONDS):
+        self.lifetime = lifetime
+
+    @abc.abstractmethod
+    def get(self, session_id):
+        """Returns the session's credentials, or None if unknown/expired."""
+
+    @abc.abstractmethod
+    def put(self, session_id, creds):
+        """Stores creds for the session, replacing any previous ones."""
+
+    @abc.abstractmethod
+    def delete(self, session_id):
+        """Forgets the session."""
+
+    @abc.abstractmethod
+    def purge_expired(self):
+        """Removes every expired session."""
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in one SQLite file, shared by every worker process."""
+
+    def __init__(self, path=SESSION_STORE_PATH, **options):
+        super().__init__(**options)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_key TEXT PRIMARY KEY, credentials BLOB NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def get(self, session_id):
+        rows = self._execute(
+            "SELECT credentials FROM sessions "
+            "WHERE session_key = ? AND updated_at > ?",
+            (_key(session_id), time.time() - self.lifetime)
+        )
+        return pickle.loads(rows[0][0]) if rows else None
+
+    def put(self, session_id, creds):
+        self._execute(
+            "INSERT OR REPLACE INTO sessions (session_key, credentials, "
+            "updated_at) VALUES (?, ?, ?)",
+            (_key(session_id), pickle.dumps(creds), time.time())
+        )
+
+    def delete(self, session_id):
+        self._execute("DELETE FROM sessions WHERE session_key = ?",
+                      (_key(session_id),))
+
+    def purge_expired(self):
+        self._execute("DELETE FROM sessions WHERE updated_at <= ?",
+                      (time.time() - self.lifetime,))
+
+
+class FileSessionStore(SessionStore):
+    """Sessions as one file each in a directory, written atomically."""
+
+    def __init__(self, directory=SESSION_STORE_PATH, **options):
+        super().__init__(**options)
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, _key(session_id))
+
+    def get(self, session_id):
+        path = self._path(session_id)
+        try:
+            if os.path.getmtime(path) <= time.time() - self.lifetime:
+                return None
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, session_id, creds):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(creds, f)
+            os.replace(temp_path, self._path(session_id))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def delete(self, session_id):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self):
+        cutoff = time.time() - self.lifetime
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) <= cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+BACKENDS = {
+    'sqlite': SQLiteSessionStore,
+    'filesystem': FileSessionStore,
+}
+
+
+def get_session_store():
+    """Returns the process-wide store selected by SESSION_STORE_BACKEND."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if SESSION_STORE_BACKEND not in BACKENDS:
+                    raise ValueError(
+                        f"Unknown SESSION_STORE_BACKEND "
+                        f"'{SESSION_STORE_BACKEND}'; expected one of "
+                        f"{', '.join(BACKENDS)}."
+                    )
+                _store = BACKENDS[SESSION_STORE_BACKEND](
+                    SESSION_STORE_PATH
+                )
+                _store.purge_expired()
+    return _store